@@ -8,6 +8,31 @@ def create_app():
     
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
+    from app.services.service_registry import ServiceRegistry
+    services = ServiceRegistry(
+        app.config['OLLAMA_BASE_URL'],
+        app.config['OLLAMA_MODEL'],
+        health_ttl=app.config['OLLAMA_HEALTH_TTL'],
+        keep_alive=app.config['OLLAMA_KEEP_ALIVE']
+    )
+    if app.config['OLLAMA_WARMUP']:
+        services.warmup()
+    app.extensions['services'] = services
+    
+    from app.services.job_manager import JobManager
+    app.extensions['job_manager'] = JobManager(
+        max_workers=app.config['BATCH_JOB_WORKERS'],
+        max_history=app.config['BATCH_JOB_HISTORY'],
+        processor_factory=services.create_batch_processor
+    )
+    
+    from app.services.folder_watcher import WatchManager
+    app.extensions['watch_manager'] = WatchManager(
+        poll_interval=app.config['WATCH_POLL_INTERVAL'],
+        settle_seconds=app.config['WATCH_SETTLE_SECONDS'],
+        processor_factory=services.create_batch_processor
+    )
+    
     from app.routes import main_bp
     app.register_blueprint(main_bp)
     
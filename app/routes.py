@@ -1,6 +1,8 @@
-from flask import Blueprint, render_template, request, jsonify, current_app
+from flask import Blueprint, render_template, request, jsonify, current_app, Response
 from werkzeug.utils import secure_filename
 import os
+import json
+import itertools
 from app.services.image_processor import ImageProcessor
 from app.services.batch_processor import BatchProcessor
 
@@ -12,10 +14,27 @@ def index():
 
 @main_bp.route('/api/status')
 def status():
-    # 简化状态检查，仅返回系统就绪状态
+    # 健康检查结果在应用级缓存，频繁轮询不会每次都请求Ollama
+    return jsonify(current_app.extensions['services'].ollama_status())
+
+@main_bp.route('/api/cache/stats')
+def cache_stats():
+    cache = current_app.extensions['services'].cache
+    if cache is None:
+        return jsonify({'success': True, 'enabled': False})
+    
+    return jsonify({'success': True, 'enabled': True, 'stats': cache.stats()})
+
+@main_bp.route('/api/ocr/stats')
+def ocr_stats():
+    services = current_app.extensions['services']
+    stats = services.ocr_stats
+    layout_cache = services.layout_cache
     return jsonify({
-        'connected': True,
-        'available_models': ['n/a']
+        'success': True,
+        'enabled': stats is not None,
+        'variants': stats.stats() if stats is not None else [],
+        'layouts': layout_cache.stats() if layout_cache is not None else None
     })
 
 @main_bp.route('/api/batch_process', methods=['POST'])
@@ -31,11 +50,221 @@ def batch_process():
         
         options = data.get('options', {})
         
+        # 异步模式：立即返回任务ID，由后台任务处理
+        if options.get('async'):
+            return _submit_batch_job(folder_path, options)
+        
+        # 流式模式：每处理完一个文件就输出一条记录
+        stream_format = _get_stream_format(options)
+        if stream_format:
+            return _stream_batch(folder_path, options, stream_format)
+        
         # 创建批量处理器
-        batch_processor = BatchProcessor()
+        batch_processor = current_app.extensions['services'].create_batch_processor()
         result = batch_processor.process_folder(folder_path, options)
         
         return jsonify(result)
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@main_bp.route('/api/batch_apply', methods=['POST'])
+def batch_apply():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'success': False, 'error': '请求数据不能为空'}), 400
+        
+        plan_id = data.get('plan_id')
+        if not plan_id:
+            return jsonify({'success': False, 'error': '请提供重命名计划ID'}), 400
+        
+        batch_processor = current_app.extensions['services'].create_batch_processor()
+        result = batch_processor.apply_plan(plan_id, data.get('options', {}))
+        
+        if not result['success']:
+            return jsonify(result), 404
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@main_bp.route('/api/batch_jobs', methods=['POST'])
+def create_batch_job():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'success': False, 'error': '请求数据不能为空'}), 400
+        
+        folder_path = data.get('folder_path')
+        if not folder_path:
+            return jsonify({'success': False, 'error': '请提供文件夹路径'}), 400
+        
+        return _submit_batch_job(folder_path, data.get('options', {}))
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@main_bp.route('/api/batch_jobs', methods=['GET'])
+def list_batch_jobs():
+    job_manager = current_app.extensions['job_manager']
+    return jsonify({'success': True, 'jobs': job_manager.list_jobs()})
+
+@main_bp.route('/api/batch_jobs/<job_id>', methods=['GET'])
+def get_batch_job(job_id):
+    job = current_app.extensions['job_manager'].get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': f'任务不存在: {job_id}'}), 404
+    
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@main_bp.route('/api/batch_jobs/<job_id>/files', methods=['GET'])
+def get_batch_job_files(job_id):
+    job = current_app.extensions['job_manager'].get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': f'任务不存在: {job_id}'}), 404
+    
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', 100, type=int)
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'offset': offset,
+        'files': job.get_files(offset, limit)
+    })
+
+@main_bp.route('/api/batch_jobs/<job_id>/cancel', methods=['POST'])
+def cancel_batch_job(job_id):
+    job = current_app.extensions['job_manager'].cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': f'任务不存在: {job_id}'}), 404
+
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@main_bp.route('/api/watch', methods=['POST'])
+def start_watch():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'success': False, 'error': '请求数据不能为空'}), 400
+        
+        folder_path = data.get('folder_path')
+        if not folder_path:
+            return jsonify({'success': False, 'error': '请提供文件夹路径'}), 400
+        
+        error = BatchProcessor.validate_folder(folder_path)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        
+        watcher = current_app.extensions['watch_manager'].start(folder_path, data.get('options', {}))
+        return jsonify({'success': True, 'watch': watcher.to_dict()}), 201
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@main_bp.route('/api/watch', methods=['GET'])
+def list_watches():
+    watch_manager = current_app.extensions['watch_manager']
+    return jsonify({'success': True, 'watches': watch_manager.list_watchers()})
+
+@main_bp.route('/api/watch/<watch_id>', methods=['GET'])
+def get_watch(watch_id):
+    watcher = current_app.extensions['watch_manager'].get(watch_id)
+    if watcher is None:
+        return jsonify({'success': False, 'error': f'监视任务不存在: {watch_id}'}), 404
+    
+    return jsonify({'success': True, 'watch': watcher.to_dict()})
+
+@main_bp.route('/api/watch/<watch_id>', methods=['DELETE'])
+def stop_watch(watch_id):
+    watcher = current_app.extensions['watch_manager'].stop(watch_id)
+    if watcher is None:
+        return jsonify({'success': False, 'error': f'监视任务不存在: {watch_id}'}), 404
+    
+    return jsonify({'success': True, 'watch': watcher.to_dict()})
+
+def _submit_batch_job(folder_path, options):
+    """校验文件夹后提交后台任务，返回202和任务ID"""
+    error = BatchProcessor.validate_folder(folder_path)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    job = current_app.extensions['job_manager'].submit(folder_path, options)
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.job_id,
+        'status': job.status,
+        'status_url': f'/api/batch_jobs/{job.job_id}'
+    }), 202
+
+def _get_stream_format(options):
+    """从选项、查询参数或Accept头中确定流式输出格式"""
+    stream_format = options.get('stream') or request.args.get('stream')
+    if stream_format in ('ndjson', 'sse'):
+        return stream_format
+    
+    accept = request.headers.get('Accept', '')
+    if 'text/event-stream' in accept:
+        return 'sse'
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    
+    return None
+
+def _stream_batch(folder_path, options, stream_format):
+    """以NDJSON或SSE格式流式返回批量处理结果"""
+    error = BatchProcessor.validate_folder(folder_path)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    batch_processor = current_app.extensions['services'].create_batch_processor()
+    image_files = batch_processor.collect_image_files(folder_path, options)
+    
+    # 先取出第一个文件确认文件夹非空，其余文件在处理时继续扫描
+    first_file = next(image_files, None)
+    if first_file is None:
+        return jsonify({'success': False, 'error': '文件夹中没有找到支持的图片文件'}), 400
+    image_files = itertools.chain([first_file], image_files)
+    
+    def generate():
+        try:
+            if options.get('preview', False):
+                # 预览需要整批规划，所有记录在规划完成后输出
+                yield from _iter_preview_records(batch_processor, folder_path, image_files, options, stream_format)
+                return
+            
+            journal = batch_processor.open_journal(folder_path, options)
+            for record in batch_processor.iter_records(image_files, options, journal):
+                yield _format_stream_record(record, stream_format)
+        except Exception as e:
+            yield _format_stream_record({'type': 'summary', 'success': False, 'error': str(e)}, stream_format)
+    
+    if stream_format == 'sse':
+        mimetype = 'text/event-stream'
+    else:
+        mimetype = 'application/x-ndjson'
+    
+    # 禁用代理缓冲，保证记录及时到达客户端
+    return Response(generate(), mimetype=mimetype, headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _iter_preview_records(batch_processor, folder_path, image_files, options, stream_format):
+    plan_id, results = batch_processor.preview_files(folder_path, image_files, options)
+    
+    for result in results:
+        yield _format_stream_record(dict(result, type='file'), stream_format)
+    
+    summary = batch_processor.build_summary(results, preview=True, plan_id=plan_id)
+    summary.pop('files')
+    yield _format_stream_record(dict(summary, type='summary'), stream_format)
+
+def _format_stream_record(record, stream_format):
+    data = json.dumps(record, ensure_ascii=False)
+    if stream_format == 'sse':
+        return f"event: {record['type']}\ndata: {data}\n\n"
+    return data + '\n'
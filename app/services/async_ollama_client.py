@@ -0,0 +1,270 @@
+import asyncio
+import functools
+import json
+import random
+import time
+from app.services.ollama_client import OllamaClient, OllamaError, CircuitOpenError
+from app.services.image_processor import ImageProcessor
+from app.services.endpoint_pool import EndpointPool
+from config import Config
+
+# httpx为可选依赖，仅异步流水线需要
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+class AsyncOllamaClient:
+    """OllamaClient的asyncio版本，方法与同步客户端一一对应
+
+    在途请求数由信号量限制，等待模型响应的文件只占用协程而不占用线程；
+    取消调用所在的任务会中断请求并释放连接。
+    """
+
+    RETRYABLE_STATUS = OllamaClient.RETRYABLE_STATUS
+
+    def __init__(self, base_url='http://localhost:11434', model='llava', timeout=60,
+                 max_concurrency=None, max_retries=None, backoff=None, image_options=None, keep_alive=None):
+        if httpx is None:
+            raise Exception('异步Ollama客户端需要安装httpx')
+
+        self.endpoint_urls = EndpointPool.parse_urls(base_url)
+        self.base_url = ','.join(self.endpoint_urls)
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency or Config.OLLAMA_POOL_SIZE
+        self.max_retries = Config.OLLAMA_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = Config.OLLAMA_RETRY_BACKOFF if backoff is None else backoff
+        self.image_options = OllamaClient.default_image_options() if image_options is None else image_options
+        # 模型在Ollama中保持加载的时长，与同步客户端相同
+        self.keep_alive = keep_alive
+        # 与同步客户端共享端点状态，在途请求数和摘除状态在两种客户端间一致
+        self.endpoints = OllamaClient._get_endpoint_pool(
+            self.endpoint_urls, OllamaClient._get_session(self.endpoint_urls, self.max_concurrency))
+        self.breaker = OllamaClient._get_breaker(self.endpoint_urls)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # 正在进行的图片分析请求，相同请求共享同一个任务
+        self._in_flight = {}
+        self._client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_concurrency
+        ))
+
+    @classmethod
+    def from_client(cls, client, **kwargs):
+        """按同步客户端的地址、模型、超时、图片参数和模型保持加载时长创建异步客户端"""
+        kwargs.setdefault('image_options', client.image_options)
+        kwargs.setdefault('keep_alive', client.keep_alive)
+        return cls(client.base_url, client.model, client.timeout, **kwargs)
+
+    async def check_connection(self):
+        for url in self.endpoint_urls:
+            try:
+                response = await self._client.get(f'{url}/api/tags', timeout=5)
+                if response.status_code == 200:
+                    return True
+            except Exception:
+                continue
+        return False
+
+    async def analyze_image(self, image_path, prompt, timeout=None, stop_when=None, schema=None, num_predict=None):
+        """返回模型的文本回复，失败时抛出OllamaError；其余参数的含义与OllamaClient相同"""
+        # 熔断打开时不必先解码和重新编码图片
+        if self.breaker.is_open():
+            raise CircuitOpenError('Ollama服务暂不可用（已熔断）')
+        image_data = await self._encode_image(image_path)
+        payload = {
+            'model': self.model,
+            'prompt': prompt,
+            'images': [image_data],
+            'stream': stop_when is not None
+        }
+        self._apply_generation_options(payload, schema, num_predict)
+
+        if self.keep_alive is not None:
+            payload['keep_alive'] = self.keep_alive
+
+        key = OllamaClient.request_key(self.base_url, self.model, prompt, image_data, schema, num_predict, stop_when)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._post('/api/generate', payload, timeout, stop_when))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # 一个调用方被取消不影响等待同一请求的其他调用方
+        result = await asyncio.shield(task)
+        return result.get('response', '')
+
+    async def chat_with_image(self, image_path, conversation_history, timeout=None):
+        """返回模型的对话回复，失败时抛出OllamaError"""
+        if self.breaker.is_open():
+            raise CircuitOpenError('Ollama服务暂不可用（已熔断）')
+        messages = [{'role': msg['role'], 'content': msg['content']} for msg in conversation_history]
+
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'images': [await self._encode_image(image_path)],
+            'stream': False
+        }
+
+        result = await self._post('/api/chat', payload, timeout)
+        return result.get('message', {}).get('content', '')
+
+    async def generate_text(self, prompt, timeout=None, schema=None, num_predict=None):
+        """返回模型生成的文本，失败时抛出OllamaError"""
+        payload = {
+            'model': self.model,
+            'prompt': prompt,
+            'stream': False
+        }
+        self._apply_generation_options(payload, schema, num_predict)
+
+        result = await self._post('/api/generate', payload, timeout)
+        return result.get('response', '')
+
+    _apply_generation_options = staticmethod(OllamaClient._apply_generation_options)
+
+    async def get_available_models(self):
+        for url in self.endpoint_urls:
+            try:
+                response = await self._client.get(f'{url}/api/tags', timeout=5)
+                if response.status_code == 200:
+                    return response.json().get('models', [])
+            except Exception:
+                continue
+        return []
+
+    async def aclose(self):
+        for task in list(self._in_flight.values()):
+            task.cancel()
+        await self._client.aclose()
+
+    async def _post(self, path, payload, timeout=None, stop_when=None):
+        """与OllamaClient._post相同的熔断逻辑"""
+        timeout = self.timeout if timeout is None else timeout
+        if timeout is not None and timeout <= 0:
+            raise OllamaError('请求超时')
+
+        if not self.breaker.allow_request():
+            raise CircuitOpenError('Ollama服务暂不可用（已熔断）')
+
+        try:
+            result = await self._post_with_retries(path, payload, timeout, stop_when)
+        except OllamaError as e:
+            if OllamaClient.is_outage(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+
+        self.breaker.record_success()
+        return result
+
+    async def _post_with_retries(self, path, payload, timeout=None, stop_when=None):
+        """与OllamaClient._post_with_retries相同的重试策略，timeout是所有尝试共享的总时长
+
+        总时长从首次取得信号量时开始计算，排队等待其他请求的时间不计入。
+        """
+        expires_at = None
+        attempt = 0
+
+        while True:
+            try:
+                async with self._semaphore:
+                    if expires_at is None and timeout:
+                        expires_at = time.time() + timeout
+                    remaining = None if expires_at is None else expires_at - time.time()
+                    if remaining is not None and remaining <= 0:
+                        raise OllamaError('请求超时')
+                    return await self._post_to_endpoint(path, payload, remaining, stop_when)
+            except OllamaError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+
+                delay = random.uniform(0, self.backoff * (2 ** attempt))
+                if expires_at is not None and time.time() + delay >= expires_at:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _post_to_endpoint(self, path, payload, timeout, stop_when=None):
+        url = self.endpoints.acquire()
+        failed = False
+        try:
+            if payload.get('stream'):
+                return await self._post_stream(f'{url}{path}', payload, timeout, stop_when)
+            return await self._post_once(f'{url}{path}', payload, timeout)
+        except OllamaError as e:
+            failed = OllamaClient.is_outage(e)
+            raise
+        finally:
+            self.endpoints.release(url, failed)
+
+    async def _post_once(self, url, payload, timeout):
+        try:
+            response = await self._client.post(url, json=payload, timeout=timeout)
+        except httpx.TimeoutException as e:
+            raise OllamaError(f'请求超时: {e}') from e
+        except (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError) as e:
+            raise OllamaError(f'连接失败: {e}', retryable=True) from e
+        except httpx.HTTPError as e:
+            raise OllamaError(f'请求失败: {e}') from e
+
+        if response.status_code != 200:
+            raise OllamaError(
+                f'{response.status_code} - {response.text}',
+                status_code=response.status_code,
+                retryable=response.status_code in self.RETRYABLE_STATUS
+            )
+
+        try:
+            return response.json()
+        except ValueError as e:
+            raise OllamaError(f'响应不是有效的JSON: {e}') from e
+
+    async def _post_stream(self, url, payload, timeout, stop_when):
+        """流式请求，stop_when返回True时退出上下文即断开连接"""
+        # httpx的超时只限制单次读取，模型持续缓慢输出时总时长在这里检查
+        expires_at = time.time() + timeout if timeout else None
+        parts = []
+        try:
+            async with self._client.stream('POST', url, json=payload, timeout=timeout) as response:
+                if response.status_code != 200:
+                    body = (await response.aread()).decode('utf-8', errors='replace')
+                    raise OllamaError(
+                        f'{response.status_code} - {body}',
+                        status_code=response.status_code,
+                        retryable=response.status_code in self.RETRYABLE_STATUS
+                    )
+
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get('error'):
+                        raise OllamaError(chunk['error'])
+
+                    parts.append(chunk.get('response', ''))
+                    if chunk.get('done'):
+                        break
+                    if stop_when is not None and stop_when(''.join(parts)):
+                        return {'response': ''.join(parts), 'done': False}
+                    if expires_at is not None and time.time() >= expires_at:
+                        raise OllamaError('请求超时')
+        except httpx.TimeoutException as e:
+            raise OllamaError(f'请求超时: {e}') from e
+        except (httpx.ConnectError, httpx.RemoteProtocolError, httpx.ReadError) as e:
+            raise OllamaError(f'连接失败: {e}', retryable=True) from e
+        except httpx.HTTPError as e:
+            raise OllamaError(f'请求失败: {e}') from e
+        except ValueError as e:
+            raise OllamaError(f'流式响应不是有效的JSON: {e}') from e
+
+        return {'response': ''.join(parts), 'done': True}
+
+    async def _encode_image(self, image_path):
+        # 解码和缩小图片放到默认线程池，避免阻塞事件循环
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(ImageProcessor.encode_for_vlm, image_path, **self.image_options))
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+class BatchJournal:
+    """批处理检查点日志
+
+    每个批次对应一个追加写入的JSONL文件，记录每个文件计划的重命名和最终结果。
+    服务重启后可以据此恢复，已成功的文件通过集合查找直接跳过，失败的文件重新处理。
+    """
+
+    # 同一进程内正在使用的日志文件，防止两个批次同时写同一个日志
+    _active_paths = set()
+    _active_lock = threading.Lock()
+
+    def __init__(self, path, fsync_every=32, fsync_interval=1.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.completed = {}
+        self.completed_targets = set()
+        self.planned = {}
+        self.finished = False
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.time()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def journal_path(journal_folder, folder_path, batch_id=None):
+        """批次ID缺省时由文件夹的真实路径生成，保证重启后能找到同一个日志"""
+        if not batch_id:
+            real_path = os.path.realpath(folder_path)
+            batch_id = hashlib.sha1(real_path.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(journal_folder, f'{batch_id}.jsonl')
+
+    @classmethod
+    def open(cls, path, resume=True, **kwargs):
+        """打开日志：未完成的旧日志在resume时继续使用，否则重新开始"""
+        with cls._active_lock:
+            if path in cls._active_paths:
+                raise Exception(f'该文件夹已有批处理正在进行: {path}')
+            cls._active_paths.add(path)
+
+        try:
+            journal = cls(path, **kwargs)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            if resume and os.path.exists(path):
+                journal._load()
+
+            # 已经完成的旧批次不再恢复，重新开始一个新日志
+            if journal.finished or not resume:
+                journal._reset()
+
+            journal._file = open(path, 'a', encoding='utf-8')
+            journal._terminate_partial_line()
+            journal._recover_planned()
+            return journal
+        except Exception:
+            with cls._active_lock:
+                cls._active_paths.discard(path)
+            raise
+
+    def is_resumed(self):
+        return bool(self.completed)
+
+    def should_skip(self, image_path):
+        """已完成的源文件及其重命名后的目标文件都直接跳过"""
+        image_path = os.path.abspath(image_path)
+        return image_path in self.completed or image_path in self.completed_targets
+
+    def completed_results(self):
+        """返回上次运行中已完成文件的结果"""
+        return [dict(record['result'], resumed=True) for record in self.completed.values()]
+
+    def record_planned(self, src, dst):
+        src = os.path.abspath(src)
+        dst = os.path.abspath(dst)
+        self.planned[src] = dst
+        self._append({'event': 'planned', 'src': src, 'dst': dst})
+
+    def record_outcome(self, src, result, dst=None):
+        src = os.path.abspath(src)
+        record = {'event': 'done', 'src': src, 'result': result}
+        if dst:
+            record['dst'] = os.path.abspath(dst)
+        self._apply(record)
+        self._append(record)
+
+    def finish(self):
+        """标记批次完成，下次运行将重新开始"""
+        self._append({'event': 'finished'})
+        self.close()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+        with BatchJournal._active_lock:
+            BatchJournal._active_paths.discard(self.path)
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半
+                    continue
+
+                if record.get('event') == 'planned':
+                    self.planned[record['src']] = record['dst']
+                elif record.get('event') == 'done':
+                    self._apply(record)
+                elif record.get('event') == 'finished':
+                    self.finished = True
+
+    def _apply(self, record):
+        src = record['src']
+        self.planned.pop(src, None)
+        # 只有成功的文件在恢复时跳过；失败的文件（如Ollama暂时不可用）下次运行重新处理
+        if record.get('result', {}).get('status') != 'success':
+            self.completed.pop(src, None)
+            return
+        self.completed[src] = record
+        if record.get('dst'):
+            self.completed_targets.add(record['dst'])
+
+    def _terminate_partial_line(self):
+        """崩溃时写了一半的最后一行补上换行，之后追加的记录不会与它连在一起而无法解析"""
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b'\n':
+                return
+        self._file.write('\n')
+        self._file.flush()
+
+    def _recover_planned(self):
+        """处理已计划但没有结果的条目：重命名已生效的补记为成功"""
+        for src, dst in list(self.planned.items()):
+            if not os.path.exists(src) and os.path.exists(dst):
+                self.record_outcome(src, {
+                    'original_name': os.path.basename(src),
+                    'new_name': os.path.basename(dst),
+                    'status': 'success'
+                }, dst)
+
+    def _reset(self):
+        self.completed = {}
+        self.completed_targets = set()
+        self.planned = {}
+        self.finished = False
+        open(self.path, 'w', encoding='utf-8').close()
+
+    def _append(self, record):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._unsynced += 1
+
+            # 批量fsync，兼顾崩溃安全和写入开销
+            if self._unsynced >= self.fsync_every or time.time() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.time()
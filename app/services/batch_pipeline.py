@@ -0,0 +1,356 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from app.services.text_extractor import run_ocr_stage
+from app.services.ocr_engine import warmup_ocr_engine
+from app.services.deadline import Deadline, DeadlineExceeded, BatchCancelled
+from app.services.async_ollama_client import AsyncOllamaClient
+
+# 持续输入（如文件夹监视）暂时没有新文件时产出的占位标记
+IDLE = object()
+
+_ocr_pool = None
+_ocr_pool_workers = 0
+_ocr_pool_lock = threading.Lock()
+
+def get_ocr_pool(workers):
+    """进程内共享的唯一OCR进程池，之后的批次不再重新启动进程和加载识别模型
+
+    工作进程数不超过CPU核数；请求的进程数超过现有进程池时换成更大的进程池，
+    旧进程池在已提交的任务完成后退出。较小的请求共用现有进程池，由流水线限制同时提交的任务数。
+    """
+    global _ocr_pool, _ocr_pool_workers
+
+    workers = max(min(int(workers), os.cpu_count() or 1), 1)
+    with _ocr_pool_lock:
+        # 工作进程异常退出后进程池不可再用，重新创建
+        broken = _ocr_pool is not None and getattr(_ocr_pool, '_broken', False)
+        if _ocr_pool is None or broken or workers > _ocr_pool_workers:
+            previous = _ocr_pool
+            # 使用spawn避免在多线程的Flask进程中fork；工作进程启动时加载OCR识别模型
+            _ocr_pool_workers = max(workers, _ocr_pool_workers)
+            _ocr_pool = ProcessPoolExecutor(
+                max_workers=_ocr_pool_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=warmup_ocr_engine
+            )
+            if previous is not None:
+                previous.shutdown(wait=False)
+        return _ocr_pool
+
+def shutdown_ocr_pool(wait=True):
+    global _ocr_pool, _ocr_pool_workers
+
+    with _ocr_pool_lock:
+        pool, _ocr_pool, _ocr_pool_workers = _ocr_pool, None, 0
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+class BatchPipeline:
+    """分阶段批处理流水线
+
+    - VLM阶段：Ollama HTTP调用属于I/O等待，使用线程池
+    - OCR阶段：Tesseract属于CPU密集型，使用进程池
+    - 提交阶段：流水线只产出提取结果，重命名由调用方线程串行提交，保证只有一个写入者
+
+    每个文件从进入VLM阶段起计时，VLM和OCR两个阶段共享file_timeout秒的预算；
+    取消后不再提交新文件，在途文件标记为skipped。
+    """
+
+    IDLE_POLL_SECONDS = 0.2
+
+    def __init__(self, text_extractor, vlm_workers=4, ocr_workers=None, max_in_flight=64):
+        self.text_extractor = text_extractor
+        self.vlm_workers = max(int(vlm_workers), 1)
+        if ocr_workers is None:
+            ocr_workers = os.cpu_count() or 1
+        self.ocr_workers = int(ocr_workers)
+        self.max_in_flight = max(int(max_in_flight), 1)
+
+    def run(self, image_files, cancel_token=None, file_timeout=None):
+        """按完成顺序分批产出[(图片路径, 提取结果)]，同一轮完成的文件为一批"""
+        vlm_pool = ThreadPoolExecutor(max_workers=self.vlm_workers, thread_name_prefix='vlm-stage')
+        ocr_pool = self._get_ocr_pool()
+
+        # future -> (阶段, 图片路径, VLM阶段的部分结果)
+        pending = {}
+        # 等待OCR名额的(图片路径, VLM阶段的部分结果)；共享进程池可能比ocr_workers大，本批同时执行的OCR不超过ocr_workers
+        ocr_waiting = []
+        files = iter(image_files)
+        exhausted = False
+
+        try:
+            while True:
+                if cancel_token is not None and cancel_token.is_cancelled():
+                    yield from self._skip_pending(pending, ocr_waiting)
+                    break
+
+                # 填充流水线，在途文件数不超过上限
+                idle = False
+                while not exhausted and len(pending) + len(ocr_waiting) < self.max_in_flight:
+                    image_path = next(files, None)
+                    if image_path is None:
+                        exhausted = True
+                        break
+                    if image_path is IDLE:
+                        idle = True
+                        break
+                    future = vlm_pool.submit(self._vlm_stage, image_path, cancel_token, file_timeout)
+                    pending[future] = ('vlm', image_path, None)
+
+                if not pending:
+                    if exhausted:
+                        break
+                    continue
+
+                # 输入暂时空闲或可能被取消时定期醒来，新文件不必等在途文件全部完成
+                poll = idle or cancel_token is not None
+                done, _ = wait(pending, timeout=self.IDLE_POLL_SECONDS if poll else None, return_when=FIRST_COMPLETED)
+                completed = []
+
+                for future in done:
+                    stage, image_path, partial = pending.pop(future)
+
+                    if stage == 'vlm':
+                        extracted_info, partial = self._finish_vlm_stage(future, image_path)
+                        if extracted_info is None:
+                            # 大模型未能提取完整信息，转入OCR阶段
+                            ocr_waiting.append((image_path, partial))
+                            continue
+                    else:
+                        extracted_info = self._finish_ocr_stage(future, image_path, partial)
+
+                    completed.append((image_path, extracted_info))
+
+                ocr_running = sum(1 for stage, _, _ in pending.values() if stage == 'ocr')
+                while ocr_waiting and (ocr_pool is None or ocr_running < self.ocr_workers):
+                    # 子进程只带走截止时间
+                    image_path, partial = ocr_waiting.pop(0)
+                    ocr_future = (ocr_pool or vlm_pool).submit(run_ocr_stage, image_path, partial[-1].detach())
+                    pending[ocr_future] = ('ocr', image_path, partial)
+                    ocr_running += 1
+
+                if completed:
+                    yield completed
+        finally:
+            # 正常结束时没有在途任务；取消或调用方提前关闭时不等待仍在执行的任务
+            interrupted = bool(pending)
+            for future in pending:
+                future.cancel()
+            # OCR进程池由各批次共享，不关闭；已开始的OCR在截止时间内结束
+            vlm_pool.shutdown(wait=not interrupted, cancel_futures=interrupted)
+
+    def _skip_pending(self, pending, ocr_waiting=()):
+        """取消后把在途文件全部标记为skipped"""
+        skipped = []
+        for future, (stage, image_path, partial) in list(pending.items()):
+            future.cancel()
+            skipped.append((image_path, self.text_extractor.interrupted_result(BatchCancelled('批处理已取消'))))
+        for image_path, partial in ocr_waiting:
+            skipped.append((image_path, self.text_extractor.interrupted_result(BatchCancelled('批处理已取消'))))
+        if skipped:
+            yield skipped
+
+    def _get_ocr_pool(self):
+        """返回共享的OCR进程池，ocr_workers为0时OCR在VLM线程池中执行"""
+        if self.ocr_workers <= 0:
+            return None
+        return get_ocr_pool(self.ocr_workers)
+
+    def _vlm_stage(self, image_path, cancel_token=None, file_timeout=None):
+        """返回(姓名, 日期, 原始文本, 缓存键, 截止时间)，命中缓存时缓存键为None"""
+        deadline = Deadline(file_timeout, cancel_token)
+        deadline.check()
+        self.text_extractor.check_image_file(image_path)
+
+        cache_key, cached = self.text_extractor.lookup_cache(image_path)
+        if cached:
+            return cached['name'], cached['date'], '[Cache]: 命中提取结果缓存', None, deadline
+
+        name, date, extracted_text = self.text_extractor.extract_with_ollama(image_path, deadline)
+        return name, date, extracted_text, cache_key, deadline
+
+    def _finish_vlm_stage(self, future, image_path):
+        """返回(最终结果, 部分结果)，需要继续OCR时最终结果为None"""
+        try:
+            name, date, extracted_text, cache_key, deadline = future.result()
+        except (DeadlineExceeded, BatchCancelled) as e:
+            return self.text_extractor.interrupted_result(e), None
+        except Exception as e:
+            return self.text_extractor.fallback_result(image_path, e), None
+
+        if name and date:
+            self.text_extractor.store_cache(cache_key, name, date)
+            return self.text_extractor.complete_with_file_info(image_path, name, date, extracted_text), None
+
+        # 大模型阶段已耗尽时间预算，不再进入OCR阶段
+        try:
+            deadline.check()
+        except (DeadlineExceeded, BatchCancelled) as e:
+            return self.text_extractor.interrupted_result(e), None
+
+        return None, (name, date, extracted_text, cache_key, deadline)
+
+    def _finish_ocr_stage(self, future, image_path, partial):
+        name, date, extracted_text, cache_key, deadline = partial
+
+        try:
+            ocr_name, ocr_date, ocr_text = future.result()
+            extracted_text += ocr_text
+            name = name or ocr_name
+            date = date or ocr_date
+        except (DeadlineExceeded, BatchCancelled) as e:
+            return self.text_extractor.interrupted_result(e)
+        except Exception as e:
+            extracted_text += f"[OCR Error]: {str(e)}"
+
+        self.text_extractor.store_cache(cache_key, name, date)
+        return self.text_extractor.complete_with_file_info(image_path, name, date, extracted_text)
+
+
+class AsyncBatchPipeline(BatchPipeline):
+    """在asyncio事件循环上运行的批处理流水线
+
+    VLM阶段改为协程，等待模型响应的文件不再各占一个线程，
+    vlm_workers作为同时发往Ollama的请求数上限，max_in_flight可以设得更大。
+    OCR阶段仍在进程池中执行；对调用方仍是同步生成器，产出格式与BatchPipeline相同。
+    """
+
+    def __init__(self, text_extractor, vlm_workers=4, ocr_workers=None, max_in_flight=256):
+        super().__init__(text_extractor, vlm_workers, ocr_workers, max_in_flight)
+
+    def run(self, image_files, cancel_token=None, file_timeout=None):
+        """事件循环在后台线程中运行，处理完的文件经队列交给调用方线程"""
+        results = queue.Queue()
+        stop_event = threading.Event()
+        finished = object()
+
+        def run_loop():
+            try:
+                asyncio.run(self._main(image_files, results, stop_event, cancel_token, file_timeout))
+            except BaseException as e:
+                results.put(e)
+            finally:
+                results.put(finished)
+
+        thread = threading.Thread(target=run_loop, name='async-pipeline', daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                item = results.get()
+                if item is finished:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # 调用方提前关闭时通知事件循环取消所有在途文件
+            stop_event.set()
+            thread.join()
+
+    async def _main(self, image_files, results, stop_event, cancel_token, file_timeout):
+        loop = asyncio.get_running_loop()
+        client = AsyncOllamaClient.from_client(self.text_extractor.ollama_client, max_concurrency=self.vlm_workers)
+        ocr_pool = self._get_ocr_pool()
+        # 输入生成器可能阻塞（扫描目录、等待监视队列），在单独的线程中读取
+        feeder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='async-pipeline-feed')
+        slots = asyncio.Semaphore(self.max_in_flight)
+        # 同时调用大模型的文件数，与线程流水线的VLM线程数相同
+        vlm_slots = asyncio.Semaphore(self.vlm_workers)
+        # 共享的OCR进程池可能比ocr_workers大，本批同时执行的OCR不超过ocr_workers
+        ocr_slots = asyncio.Semaphore(self.ocr_workers) if ocr_pool is not None else None
+        tasks = set()
+        files = iter(image_files)
+
+        def stopping():
+            return stop_event.is_set() or (cancel_token is not None and cancel_token.is_cancelled())
+
+        async def watch_stop():
+            while not stopping():
+                await asyncio.sleep(self.IDLE_POLL_SECONDS)
+            for task in list(tasks):
+                task.cancel()
+
+        async def process(image_path):
+            try:
+                extracted_info = await self._process_file(client, ocr_pool, vlm_slots, ocr_slots, image_path, cancel_token, file_timeout)
+            except asyncio.CancelledError:
+                extracted_info = self.text_extractor.interrupted_result(BatchCancelled('批处理已取消'))
+            finally:
+                slots.release()
+            # 调用方已关闭生成器时不再产出结果
+            if not stop_event.is_set():
+                results.put([(image_path, extracted_info)])
+
+        watcher = asyncio.create_task(watch_stop())
+        try:
+            while not stopping():
+                await slots.acquire()
+                image_path = await loop.run_in_executor(feeder, next, files, None)
+                if image_path is None or image_path is IDLE or stopping():
+                    slots.release()
+                    if image_path is None:
+                        break
+                    continue
+
+                task = asyncio.create_task(process(image_path))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            watcher.cancel()
+            for task in list(tasks):
+                task.cancel()
+            feeder.shutdown(wait=False)
+            await client.aclose()
+
+    async def _process_file(self, client, ocr_pool, vlm_slots, ocr_slots, image_path, cancel_token, file_timeout):
+        """与extract_info相同的流程：缓存、大模型、OCR、文件信息补全"""
+        loop = asyncio.get_running_loop()
+        extractor = self.text_extractor
+
+        try:
+            # 与_vlm_stage在VLM线程中才开始计时一样，取得VLM名额后才开始计时，排队的文件不消耗时间预算
+            async with vlm_slots:
+                deadline = Deadline(file_timeout, cancel_token)
+                deadline.check()
+                extractor.check_image_file(image_path)
+
+                # 计算内容哈希需要读完整个文件，放到默认线程池
+                cache_key, cached = await loop.run_in_executor(None, extractor.lookup_cache, image_path)
+                if cached:
+                    return extractor.complete_with_file_info(image_path, cached['name'], cached['date'], '[Cache]: 命中提取结果缓存')
+
+                name, date, extracted_text = await extractor.extract_with_ollama_async(client, image_path, deadline)
+
+            if not name or not date:
+                deadline.check()
+                try:
+                    if ocr_slots is None:
+                        ocr_name, ocr_date, ocr_text = await loop.run_in_executor(
+                            None, run_ocr_stage, image_path, deadline.detach())
+                    else:
+                        async with ocr_slots:
+                            ocr_name, ocr_date, ocr_text = await loop.run_in_executor(
+                                ocr_pool, run_ocr_stage, image_path, deadline.detach())
+                    extracted_text += ocr_text
+                    name = name or ocr_name
+                    date = date or ocr_date
+                except (DeadlineExceeded, BatchCancelled):
+                    raise
+                except Exception as e:
+                    extracted_text += f"[OCR Error]: {str(e)}"
+
+            extractor.store_cache(cache_key, name, date)
+            return extractor.complete_with_file_info(image_path, name, date, extracted_text)
+
+        except (DeadlineExceeded, BatchCancelled) as e:
+            return extractor.interrupted_result(e)
+        except Exception as e:
+            return extractor.fallback_result(image_path, e)
@@ -3,137 +3,371 @@ import re
 from datetime import datetime
 from app.services.image_processor import ImageProcessor
 from app.services.text_extractor import TextExtractor
+from app.services.batch_pipeline import BatchPipeline, AsyncBatchPipeline, IDLE
+from app.services.batch_journal import BatchJournal
+from app.services.extraction_cache import get_default_cache
+from app.services.rename_planner import RenamePlanner
+from app.services.file_scanner import FileScanner
+from app.services.rename_plan_store import RenamePlanStore
+from app.services.deadline import Deadline
+from config import Config
 
 class BatchProcessor:
-    def __init__(self):
+    SUPPORTED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif'}
+    # 超时和取消的文件没有真正处理过，不写入检查点日志，恢复时会重新处理
+    INTERRUPTED_STATUSES = ('timeout', 'skipped')
+    
+    def __init__(self, text_extractor=None):
         self.image_processor = ImageProcessor()
-        self.text_extractor = TextExtractor()
-        self.supported_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.gif'}
+        # 应用内通过ServiceRegistry传入共享的提取器，避免每次创建都探测Ollama连接
+        self.text_extractor = text_extractor or TextExtractor(cache=get_default_cache())
+        self.supported_extensions = self.SUPPORTED_EXTENSIONS
+        self.plan_store = RenamePlanStore(Config.BATCH_PLAN_FOLDER, Config.BATCH_PLAN_TTL)
     
-    def process_folder(self, folder_path, options):
-        """处理文件夹中的所有图片"""
+    @staticmethod
+    def validate_folder(folder_path):
+        """检查文件夹路径是否可用，返回错误信息，无错误时返回None"""
         if not os.path.exists(folder_path):
-            return {'success': False, 'error': f'文件夹不存在: {folder_path}'}
+            return f'文件夹不存在: {folder_path}'
         
         if not os.path.isdir(folder_path):
-            return {'success': False, 'error': f'路径不是文件夹: {folder_path}'}
+            return f'路径不是文件夹: {folder_path}'
         
-        # 提取选项
-        overwrite = options.get('overwrite', True)
-        recursive = options.get('recursive', True)
-        preview = options.get('preview', True)
+        return None
+    
+    def collect_image_files(self, folder_path, options):
+        """按选项惰性扫描文件夹中需要处理的图片文件，返回生成器"""
+        max_depth = options.get('max_depth')
+        if not options.get('recursive', True):
+            max_depth = 0
         
-        # 收集所有图片文件
-        image_files = self._collect_image_files(folder_path, recursive)
+        scanner = FileScanner(
+            self.supported_extensions,
+            include=options.get('include'),
+            exclude=options.get('exclude'),
+            max_depth=max_depth,
+            sort=options.get('sort', False)
+        )
+        return scanner.scan(folder_path)
+    
+    def open_journal(self, folder_path, options):
+        """打开批次检查点日志，options中journal为False时不记录"""
+        if not options.get('journal', Config.BATCH_JOURNAL_ENABLED):
+            return None
         
-        if not image_files:
-            return {'success': False, 'error': '文件夹中没有找到支持的图片文件'}
+        path = BatchJournal.journal_path(Config.BATCH_JOURNAL_FOLDER, folder_path, options.get('batch_id'))
+        return BatchJournal.open(
+            path,
+            resume=options.get('resume', True),
+            fsync_every=Config.BATCH_JOURNAL_FSYNC_EVERY,
+            fsync_interval=Config.BATCH_JOURNAL_FSYNC_INTERVAL
+        )
+    
+    def iter_process(self, image_files, options, journal=None, cancel_token=None):
+        """处理图片，每处理完一个文件就产出其结果"""
+        if journal is None:
+            for _, result in self._iter_process(image_files, options, None, cancel_token):
+                yield result
+            return
         
-        # 处理每个图片
-        results = []
-        total_files = len(image_files)
-        success_count = 0
-        error_count = 0
+        try:
+            # 恢复的批次：先输出上次已完成的结果，再跳过这些文件
+            yield from journal.completed_results()
+            pending_files = (path for path in image_files if not journal.should_skip(path))
+            for _, result in self._iter_process(pending_files, options, journal, cancel_token):
+                yield result
+            # 被取消的批次保留日志，下次运行从中断处继续
+            if cancel_token is None or not cancel_token.is_cancelled():
+                journal.finish()
+        finally:
+            journal.close()
+    
+    def iter_process_items(self, image_files, options, cancel_token=None):
+        """持续处理监视文件夹中的新文件，产出(图片路径, 结果)，不使用日志
         
-        for i, image_path in enumerate(image_files):
+        文件夹中随时有新文件写入，每批重命名前重新列举目录。
+        """
+        return self._iter_process(image_files, options, None, cancel_token, fresh_listing=True)
+    
+    def _iter_process(self, image_files, options, journal, cancel_token=None, fresh_listing=False):
+        """产出(图片路径, 结果)"""
+        overwrite = options.get('overwrite', True)
+        planner = RenamePlanner()
+        
+        for extracted_items in self._iter_extracted(image_files, options, cancel_token):
+            if fresh_listing:
+                # 规划器缓存的目录列举不会看到之后写入的文件，每批使用新的规划器
+                planner = RenamePlanner()
+            results = self.commit_renames(planner, extracted_items, overwrite, journal)
+            yield from zip((image_path for image_path, _ in extracted_items), results)
+    
+    def _iter_extracted(self, image_files, options, cancel_token=None):
+        """提取姓名和日期，分批产出[(图片路径, 提取结果)]"""
+        file_timeout = options.get('file_timeout', Config.BATCH_FILE_TIMEOUT)
+        
+        # 默认使用分阶段并行流水线，结果按完成顺序产出；pipeline为asyncio时VLM阶段运行在事件循环上
+        if options.get('parallel', True):
+            concurrency = options.get('concurrency', {})
+            pipeline_class = AsyncBatchPipeline if options.get('pipeline', Config.BATCH_PIPELINE) == 'asyncio' else BatchPipeline
+            pipeline = pipeline_class(
+                self.text_extractor,
+                vlm_workers=concurrency.get('vlm', Config.BATCH_VLM_WORKERS),
+                ocr_workers=concurrency.get('ocr', Config.BATCH_OCR_WORKERS),
+                max_in_flight=concurrency.get('max_in_flight', Config.BATCH_MAX_IN_FLIGHT)
+            )
+            yield from pipeline.run(image_files, cancel_token, file_timeout)
+            return
+        
+        for image_path in image_files:
+            if cancel_token is not None and cancel_token.is_cancelled():
+                break
+            if image_path is IDLE:
+                continue
+            
             try:
-                result = self._process_single_image(image_path, overwrite)
-                results.append(result)
-                if result['status'] == 'success':
-                    success_count += 1
-                else:
-                    error_count += 1
+                # 提取图片中的姓名和日期
+                extracted_info = self.text_extractor.extract_info(image_path, Deadline(file_timeout, cancel_token))
             except Exception as e:
-                results.append({
-                    'original_name': os.path.basename(image_path),
-                    'status': 'error',
-                    'error': str(e)
-                })
-                error_count += 1
+                extracted_info = {'name': None, 'date': None, 'error': str(e)}
+            yield [(image_path, extracted_info)]
+    
+    def iter_records(self, image_files, options, journal=None, cancel_token=None):
+        """流式输出：每个文件一条记录，最后输出一条汇总记录"""
+        counts = {'success': 0, 'error': 0, 'timeout': 0, 'skipped': 0}
         
-        # 返回处理结果
-        return {
+        for result in self.iter_process(image_files, options, journal, cancel_token):
+            counts[result['status']] += 1
+            yield dict(result, type='file')
+        
+        yield {
+            'type': 'summary',
             'success': True,
-            'total_files': total_files,
-            'success_files': success_count,
-            'error_files': error_count,
-            'files': results
+            'total_files': sum(counts.values()),
+            'success_files': counts['success'],
+            'error_files': counts['error'],
+            'timeout_files': counts['timeout'],
+            'skipped_files': counts['skipped']
         }
     
-    def _collect_image_files(self, folder_path, recursive):
-        """收集文件夹中的所有图片文件"""
-        image_files = []
+    def process_folder(self, folder_path, options):
+        """处理文件夹中的所有图片"""
+        error = self.validate_folder(folder_path)
+        if error:
+            return {'success': False, 'error': error}
+        
+        # 提取选项
+        preview = options.get('preview', False)
         
-        if recursive:
-            for root, _, files in os.walk(folder_path):
-                for file in files:
-                    if self._is_supported_image(file):
-                        image_files.append(os.path.join(root, file))
-        else:
-            for file in os.listdir(folder_path):
-                file_path = os.path.join(folder_path, file)
-                if os.path.isfile(file_path) and self._is_supported_image(file):
-                    image_files.append(file_path)
+        # 边扫描边处理图片
+        image_files = self.collect_image_files(folder_path, options)
+        
+        # 预览模式：只提取和规划，不修改文件系统
+        if preview:
+            plan_id, results = self.preview_files(folder_path, image_files, options)
+            if not results:
+                return {'success': False, 'error': '文件夹中没有找到支持的图片文件'}
+            return self.build_summary(results, preview=True, plan_id=plan_id)
+        
+        results = []
+        journal = self.open_journal(folder_path, options)
+        for result in self.iter_process(image_files, options, journal):
+            results.append(result)
+        
+        if not results:
+            return {'success': False, 'error': '文件夹中没有找到支持的图片文件'}
         
-        return image_files
+        # 返回处理结果
+        return self.build_summary(results)
     
-    def _is_supported_image(self, filename):
-        """检查文件是否为支持的图片格式"""
-        ext = os.path.splitext(filename)[1].lower()
-        return ext in self.supported_extensions
+    def preview_files(self, folder_path, image_files, options, cancel_token=None):
+        """提取全部文件并整批规划重命名，保存计划但不修改文件，返回(计划ID, 结果列表)"""
+        extracted_items = []
+        for items in self._iter_extracted(image_files, options, cancel_token):
+            extracted_items.extend(items)
+        
+        if not extracted_items:
+            return None, []
+        
+        rename_items, results = self._build_rename_items(extracted_items)
+        
+        # 整批一次规划，互换和循环重命名在执行时统一处理
+        plan = RenamePlanner().plan(rename_items)
+        
+        entries = []
+        for src, dst in plan.items():
+            signature = self._file_signature(src)
+            if signature is None:
+                results[src] = self._error_result(src, '文件在预览过程中已被移动或删除')
+                continue
+            
+            entries.append({'src': src, 'dst': dst, 'signature': signature})
+            results[src] = {
+                'original_name': os.path.basename(src),
+                'new_name': os.path.basename(dst),
+                'status': 'success'
+            }
+        
+        plan_id = self.plan_store.save({
+            'folder_path': folder_path,
+            'overwrite': options.get('overwrite', True),
+            'entries': entries
+        })
+        
+        return plan_id, [results[image_path] for image_path, _ in extracted_items]
     
-    def _process_single_image(self, image_path, overwrite):
-        """处理单个图片文件"""
-        original_name = os.path.basename(image_path)
+    def apply_plan(self, plan_id, options):
+        """按预览时保存的计划执行重命名，不再重新提取"""
+        plan = self.plan_store.load(plan_id)
+        if plan is None:
+            return {'success': False, 'error': f'重命名计划不存在或已过期: {plan_id}'}
         
-        try:
-            # 提取图片中的姓名和日期
-            extracted_info = self.text_extractor.extract_info(image_path)
+        overwrite = options.get('overwrite', plan.get('overwrite', True))
+        results = {}
+        moves = {}
+        
+        for entry in plan['entries']:
+            src, dst = entry['src'], entry['dst']
+            signature = tuple(entry['signature'])
             
-            if not extracted_info.get('name') or not extracted_info.get('date'):
-                return {
-                    'original_name': original_name,
-                    'status': 'error',
-                    'error': '无法从图片中提取姓名和日期'
+            if self._file_signature(src) == signature:
+                moves[src] = dst
+            elif src != dst and self._file_signature(dst) == signature:
+                # 计划已经执行过（例如上次执行中途中断）
+                results[src] = {
+                    'original_name': os.path.basename(src),
+                    'new_name': os.path.basename(dst),
+                    'status': 'success'
                 }
-            
-            # 生成新文件名
-            new_filename = self._generate_new_filename(extracted_info, image_path)
-            
-            # 确保新文件名有正确的扩展名
-            ext = os.path.splitext(original_name)[1]
-            new_filename_with_ext = f"{new_filename}{ext}"
-            
-            # 生成新文件路径
-            directory = os.path.dirname(image_path)
-            new_path = os.path.join(directory, new_filename_with_ext)
-            
-            # 检查是否需要覆盖
-            if os.path.exists(new_path) and not overwrite:
-                return {
-                    'original_name': original_name,
-                    'status': 'error',
-                    'error': '新文件名已存在，且未选择覆盖选项'
+            else:
+                results[src] = self._error_result(src, '文件在预览后已被修改、移动或删除，请重新预览')
+        
+        planner = RenamePlanner()
+        
+        # 目标文件名在预览后被其他文件占用的条目不执行，避免覆盖
+        for src, error in planner.find_conflicts(moves).items():
+            moves.pop(src)
+            results[src] = self._error_result(src, error)
+        
+        outcomes = planner.commit(moves, overwrite)
+        for src, dst in moves.items():
+            error = outcomes.get(src)
+            if error:
+                results[src] = self._error_result(src, error)
+            else:
+                results[src] = {
+                    'original_name': os.path.basename(src),
+                    'new_name': os.path.basename(dst),
+                    'status': 'success'
                 }
+        
+        self.plan_store.delete(plan_id)
+        
+        ordered = [results[entry['src']] for entry in plan['entries']]
+        return self.build_summary(ordered, plan_id=plan_id)
+    
+    def build_summary(self, results, **extra):
+        """汇总逐文件结果"""
+        counts = {'success': 0, 'error': 0, 'timeout': 0, 'skipped': 0}
+        for result in results:
+            counts[result['status']] += 1
+        
+        summary = {
+            'success': True,
+            'total_files': len(results),
+            'success_files': counts['success'],
+            'error_files': counts['error'],
+            'timeout_files': counts['timeout'],
+            'skipped_files': counts['skipped'],
+            'files': results
+        }
+        summary.update(extra)
+        return summary
+    
+    def commit_renames(self, planner, extracted_items, overwrite, journal=None):
+        """规划并提交一批重命名，按输入顺序返回每个文件的结果"""
+        new_paths = {}
+        rename_items, results = self._build_rename_items(extracted_items)
+        
+        # 在内存中统一解决文件名冲突
+        plan = planner.plan(rename_items)
+        
+        # 重命名前先记录计划，崩溃后可据此判断重命名是否已生效
+        if journal is not None:
+            for src, dst in plan.items():
+                if src != dst:
+                    journal.record_planned(src, dst)
+        
+        outcomes = planner.commit(plan, overwrite)
+        
+        for src, dst in plan.items():
+            error = outcomes.get(src)
+            if error:
+                results[src] = self._error_result(src, error)
+            else:
+                new_paths[src] = dst
+                results[src] = {
+                    'original_name': os.path.basename(src),
+                    'new_name': os.path.basename(dst),
+                    'status': 'success'
+                }
+        
+        ordered_results = []
+        for image_path, _ in extracted_items:
+            result = results[image_path]
+            if journal is not None and result['status'] not in self.INTERRUPTED_STATUSES:
+                journal.record_outcome(image_path, result, new_paths.get(image_path))
+            ordered_results.append(result)
+        
+        return ordered_results
+    
+    def _build_rename_items(self, extracted_items):
+        """返回(待规划的[(源路径, 基础文件名, 扩展名)], 提取失败文件的结果)"""
+        rename_items = []
+        results = {}
+        
+        for image_path, extracted_info in extracted_items:
+            if extracted_info.get('status') in self.INTERRUPTED_STATUSES:
+                results[image_path] = self._interrupted_result(image_path, extracted_info)
+                continue
             
-            # 重命名文件
-            os.rename(image_path, new_path)
-            
-            return {
-                'original_name': original_name,
-                'new_name': new_filename_with_ext,
-                'status': 'success'
-            }
+            if not extracted_info.get('name') or not extracted_info.get('date'):
+                results[image_path] = self._error_result(image_path, '无法从图片中提取姓名和日期')
+                continue
             
-        except Exception as e:
-            return {
-                'original_name': original_name,
-                'status': 'error',
-                'error': str(e)
-            }
+            # 生成新文件名，确保新文件名有正确的扩展名
+            base_filename = self._generate_new_filename(extracted_info)
+            ext = os.path.splitext(image_path)[1]
+            rename_items.append((image_path, base_filename, ext))
+        
+        return rename_items, results
+    
+    @staticmethod
+    def _error_result(image_path, error):
+        return {
+            'original_name': os.path.basename(image_path),
+            'status': 'error',
+            'error': error
+        }
+    
+    @staticmethod
+    def _interrupted_result(image_path, extracted_info):
+        return {
+            'original_name': os.path.basename(image_path),
+            'status': extracted_info['status'],
+            'error': '处理超时' if extracted_info['status'] == 'timeout' else '批处理已取消'
+        }
+    
+    @staticmethod
+    def _file_signature(image_path):
+        """用文件大小和修改时间判断文件在预览后是否变化"""
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
     
-    def _generate_new_filename(self, extracted_info, original_path):
-        """生成新的文件名，格式为：姓名_日期"""
+    def _generate_new_filename(self, extracted_info):
+        """生成新的基础文件名，格式为：姓名_日期，唯一性由RenamePlanner保证"""
         name = extracted_info.get('name', '未知').strip()
         date_str = extracted_info.get('date', '').strip()
         
@@ -144,24 +378,7 @@ class BatchProcessor:
         date = self._normalize_date(date_str)
         
         # 生成基础文件名
-        base_filename = f"{name}_{date}"
-        
-        # 确保文件名唯一
-        directory = os.path.dirname(original_path)
-        counter = 1
-        new_filename = base_filename
-        
-        while True:
-            # 检查文件是否存在
-            test_path = os.path.join(directory, f"{new_filename}{os.path.splitext(original_path)[1]}")
-            if not os.path.exists(test_path) or test_path == original_path:
-                break
-            
-            # 如果存在，添加计数器
-            new_filename = f"{base_filename}_{counter}"
-            counter += 1
-        
-        return new_filename
+        return f"{name}_{date}"
     
     def _normalize_date(self, date_str):
         """标准化日期格式为YYYYMMDD"""
@@ -0,0 +1,75 @@
+import threading
+import time
+
+class CircuitBreaker:
+    """熔断器
+
+    - closed：正常放行，连续失败达到failure_threshold次后打开
+    - open：直接拒绝，reset_timeout秒后进入半开
+    - half_open：只放行一个探测请求，成功则关闭，失败则重新打开
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            now = time.time()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_started_at = None
+
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.HALF_OPEN:
+                # 探测请求被取消而没有回报结果时，超时后允许新的探测
+                stale = self._probe_started_at is not None and now - self._probe_started_at >= self.reset_timeout
+                if self._probe_started_at is None or stale:
+                    self._probe_started_at = now
+                    return True
+
+            return False
+
+    def is_open(self):
+        """当前是否会拒绝请求；只查看状态，不占用半开状态的探测名额，用于在准备请求前快速失败"""
+        with self._lock:
+            now = time.time()
+            if self.state == self.OPEN:
+                return now - self.opened_at < self.reset_timeout
+            if self.state == self.HALF_OPEN:
+                return self._probe_started_at is not None and now - self._probe_started_at < self.reset_timeout
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._probe_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self._probe_started_at = None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'opened_at': self.opened_at
+            }
@@ -0,0 +1,68 @@
+import threading
+import time
+
+class DeadlineExceeded(Exception):
+    """单个文件的处理时间预算已用完"""
+    pass
+
+class BatchCancelled(Exception):
+    """批处理任务已被取消"""
+    pass
+
+class CancelToken:
+    """协作式取消标记，由任务持有，各处理阶段在合适的位置检查"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise BatchCancelled('批处理已取消')
+
+
+class Deadline:
+    """单个文件在所有提取阶段共享的时间预算
+
+    使用绝对时间记录截止时刻，可以传给OCR进程池中的子进程；
+    取消标记只在本进程内有效，传入子进程前用detach()去掉。
+    """
+
+    def __init__(self, seconds=None, cancel_token=None, expires_at=None):
+        if expires_at is None and seconds:
+            expires_at = time.time() + seconds
+        self.expires_at = expires_at
+        self.cancel_token = cancel_token
+
+    def remaining(self):
+        """剩余秒数，不限时返回None"""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.time(), 0.0)
+
+    def expired(self):
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    def check(self):
+        """已取消或已超时则抛出异常"""
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+        if self.expired():
+            raise DeadlineExceeded('处理超时')
+
+    def timeout(self, default=None):
+        """给阻塞调用使用的超时时间：取默认值与剩余时间中较小的一个"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if default is None:
+            return remaining
+        return min(default, remaining)
+
+    def detach(self):
+        return Deadline(expires_at=self.expires_at)
@@ -1,4 +1,9 @@
 import os
+import cv2
+from app.services.ocr_engine import get_ocr_engine
+from app.services.ollama_client import OllamaClient, OllamaError
+from app.services.feature_converter import FeatureToTextConverter
+from config import Config
 
 class DiagnosisService:
     def __init__(self, ollama_base_url='http://localhost:11434', model='qwen3-vl:4b'):
@@ -26,6 +31,41 @@ class DiagnosisService:
                 'error': f'信息提取失败: {str(e)}'
             }
     
+    def diagnose_features(self, features, timeout=None):
+        """根据眼底图像特征请求大模型诊断
+        
+        OLLAMA_STRUCTURED_OUTPUT开启时按DIAGNOSIS_SCHEMA约束输出JSON，生成的token数不超过OLLAMA_DIAGNOSIS_NUM_PREDICT。
+        """
+        structured = Config.OLLAMA_STRUCTURED_OUTPUT
+        features_text = FeatureToTextConverter.convert_to_text(features)
+        prompt = FeatureToTextConverter.generate_diagnosis_prompt(features_text, structured=structured)
+        
+        try:
+            client = OllamaClient(base_url=self.ollama_base_url, model=self.model)
+            response = client.generate_text(
+                prompt,
+                timeout=timeout,
+                schema=FeatureToTextConverter.DIAGNOSIS_SCHEMA if structured else None,
+                num_predict=Config.OLLAMA_DIAGNOSIS_NUM_PREDICT
+            )
+        except OllamaError as e:
+            return {
+                'success': False,
+                'error': f'诊断失败: {str(e)}'
+            }
+        
+        if structured:
+            diagnosis = FeatureToTextConverter.parse_structured_diagnosis(response)
+        else:
+            diagnosis = FeatureToTextConverter.extract_diagnosis_from_response(response)
+        
+        return {
+            'success': True,
+            'diagnosis': diagnosis,
+            'features': features,
+            'raw_llm_response': response
+        }
+    
     def get_diagnosis_summary(self, diagnosis):
         """简化的诊断摘要方法"""
         if not diagnosis.get('success'):
@@ -77,23 +117,23 @@ class DiagnosisService:
                                          cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
                                          cv2.THRESH_BINARY, 11, 2)
             
-            # 使用pytesseract提取文本，尝试多种配置
+            # 使用共享的OCR引擎提取文本，尝试多种配置
+            ocr_engine = get_ocr_engine()
             text = ""
             
             # 基础配置
-            text = pytesseract.image_to_string(thresh, lang='chi_sim+eng')
+            text = ocr_engine.image_to_string(thresh, lang='chi_sim+eng')
             
             # 如果基础配置提取结果为空，尝试其他配置
             if not text.strip():
                 # 尝试使用PIL直接打开图像
                 from PIL import Image
                 pil_img = Image.open(image_path)
-                text = pytesseract.image_to_string(pil_img, lang='chi_sim+eng')
+                text = ocr_engine.image_to_string(pil_img, lang='chi_sim+eng')
             
             # 尝试使用不同的页面分割模式
             if not text.strip():
-                text = pytesseract.image_to_string(thresh, lang='chi_sim+eng', 
-                                                  config='--psm 6')
+                text = ocr_engine.image_to_string(thresh, lang='chi_sim+eng', psm=6)
             
             print(f"提取到的文本: {repr(text)}")
             return text
@@ -0,0 +1,88 @@
+import threading
+import time
+
+class EndpointPool:
+    """多个Ollama端点之间的负载均衡
+
+    每次调用选择在途请求最少的端点，并列时轮流选择；
+    连续失败max_failures次的端点被摘除，后台每隔recheck_interval秒做一次健康检查，
+    通过后恢复。只有一个端点或全部被摘除时仍然照常使用，由调用方的重试和熔断处理。
+    """
+
+    def __init__(self, urls, probe, max_failures=3, recheck_interval=10.0):
+        self.urls = list(urls)
+        self.probe = probe
+        self.max_failures = max_failures
+        self.recheck_interval = recheck_interval
+        self._outstanding = {url: 0 for url in self.urls}
+        self._failures = {url: 0 for url in self.urls}
+        self._ejected = set()
+        self._rotation = 0
+        self._probe_thread = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse_urls(base_url):
+        """支持单个地址、逗号分隔的多个地址或地址列表"""
+        if isinstance(base_url, str):
+            base_url = base_url.split(',')
+        return [url.strip().rstrip('/') for url in base_url if url and url.strip()]
+
+    def acquire(self):
+        """选择一个端点并计入在途请求，调用结束后必须release"""
+        with self._lock:
+            candidates = [url for url in self.urls if url not in self._ejected] or self.urls
+            start = self._rotation % len(candidates)
+            self._rotation += 1
+            ordered = candidates[start:] + candidates[:start]
+            url = min(ordered, key=lambda candidate: self._outstanding[candidate])
+            self._outstanding[url] += 1
+            return url
+
+    def release(self, url, failed=False):
+        with self._lock:
+            self._outstanding[url] -= 1
+            if not failed:
+                self._failures[url] = 0
+                return
+
+            self._failures[url] += 1
+            if (self._failures[url] >= self.max_failures and url not in self._ejected
+                    and len(self.urls) > 1):
+                self._ejected.add(url)
+                self._start_probe()
+
+    def stats(self):
+        with self._lock:
+            return [{
+                'url': url,
+                'healthy': url not in self._ejected,
+                'outstanding': self._outstanding[url],
+                'consecutive_failures': self._failures[url]
+            } for url in self.urls]
+
+    def _start_probe(self):
+        if self._probe_thread is None:
+            self._probe_thread = threading.Thread(target=self._probe_loop, name='ollama-endpoint-probe', daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        """定期检查被摘除的端点，全部恢复后线程退出"""
+        while True:
+            time.sleep(self.recheck_interval)
+
+            with self._lock:
+                ejected = list(self._ejected)
+                if not ejected:
+                    self._probe_thread = None
+                    return
+
+            for url in ejected:
+                try:
+                    healthy = self.probe(url)
+                except Exception:
+                    healthy = False
+                if healthy:
+                    with self._lock:
+                        self._ejected.discard(url)
+                        self._failures[url] = 0
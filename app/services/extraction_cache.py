@@ -0,0 +1,135 @@
+import hashlib
+import json
+import time
+from app.services.lazy_instance import LazyInstance
+from app.services.sqlite_store import SqliteStore
+from config import Config
+
+class ExtractionCache(SqliteStore):
+    """基于内容寻址的提取结果缓存
+
+    以图片字节的SHA-256、模型名、提示词版本和提取设置作为键，结果保存在SQLite中，
+    超出条目数或容量上限时按最近最少使用(LRU)淘汰。
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS extraction_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_last_access ON extraction_cache (last_access);
+    '''
+
+    def __init__(self, db_path, max_entries=100000, max_bytes=64 * 1024 * 1024):
+        super().__init__(db_path, synchronous='NORMAL')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        row = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extraction_cache').fetchone()
+        self._entries, self._bytes = row
+
+    @staticmethod
+    def hash_file(image_path, chunk_size=1024 * 1024):
+        """计算图片文件内容的SHA-256"""
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(content_hash, model, prompt_version, settings=None):
+        """settings为影响提取结果的其余设置（输出模式、图片编码参数等），取其哈希参与组成键"""
+        key = f'{content_hash}:{model}:{prompt_version}'
+        if settings:
+            encoded = json.dumps(settings, sort_keys=True, default=str)
+            key += ':' + hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+        return key
+
+    def get(self, key):
+        """命中时返回缓存的字典并刷新访问时间，未命中返回None"""
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM extraction_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute('UPDATE extraction_cache SET last_access = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode('utf-8'))
+
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM extraction_cache WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO extraction_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)',
+                (key, data, size, time.time())
+            )
+            if old is None:
+                self._entries += 1
+            else:
+                self._bytes -= old[0]
+            self._bytes += size
+
+            self._evict()
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': self._entries,
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM extraction_cache')
+            self._conn.commit()
+            self._entries = 0
+            self._bytes = 0
+
+    def _evict(self):
+        """按访问时间从旧到新淘汰，直到满足条目数和容量上限"""
+        while self._entries > self.max_entries or self._bytes > self.max_bytes:
+            rows = self._conn.execute(
+                'SELECT key, size FROM extraction_cache ORDER BY last_access LIMIT 64'
+            ).fetchall()
+            if not rows:
+                break
+
+            for key, size in rows:
+                if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+                    break
+                self._conn.execute('DELETE FROM extraction_cache WHERE key = ?', (key,))
+                self._entries -= 1
+                self._bytes -= size
+                self.evictions += 1
+
+
+_default_cache = LazyInstance(lambda: ExtractionCache(
+    Config.EXTRACTION_CACHE_PATH,
+    max_entries=Config.EXTRACTION_CACHE_MAX_ENTRIES,
+    max_bytes=Config.EXTRACTION_CACHE_MAX_BYTES
+))
+
+def get_default_cache():
+    """按配置创建进程内共享的缓存实例，未启用时返回None；应用内通过ServiceRegistry取得"""
+    if not Config.EXTRACTION_CACHE_ENABLED:
+        return None
+    return _default_cache.get()
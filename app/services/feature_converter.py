@@ -1,4 +1,20 @@
+import json
+
 class FeatureToTextConverter:
+    DIAGNOSIS_RESULTS = ['正常', '轻度糖尿病视网膜病变', '中度糖尿病视网膜病变', '重度糖尿病视网膜病变', '增殖性糖尿病视网膜病变']
+    RISK_LEVELS = ['低风险', '中风险', '高风险', '极高风险']
+    # 结构化诊断输出的JSON Schema，作为Ollama请求的format参数
+    DIAGNOSIS_SCHEMA = {
+        'type': 'object',
+        'properties': {
+            'result': {'type': 'string', 'enum': DIAGNOSIS_RESULTS},
+            'analysis': {'type': 'string'},
+            'risk_level': {'type': 'string', 'enum': RISK_LEVELS},
+            'recommendations': {'type': 'array', 'items': {'type': 'string'}}
+        },
+        'required': ['result', 'analysis', 'risk_level', 'recommendations']
+    }
+    
     @staticmethod
     def convert_to_text(features):
         text_description = []
@@ -76,7 +92,11 @@ class FeatureToTextConverter:
         return "\n".join(text_description)
     
     @staticmethod
-    def generate_diagnosis_prompt(features_text):
+    def generate_diagnosis_prompt(features_text, structured=False):
+        """structured为True时要求按DIAGNOSIS_SCHEMA输出JSON，请求时需同时传入该schema"""
+        if structured:
+            return FeatureToTextConverter._generate_structured_prompt(features_text)
+        
         prompt = f"""
 你是一位专业的眼科医生，专门负责糖尿病视网膜病变的诊断。请根据以下眼底图像分析报告，给出专业的诊断意见。
 
@@ -99,6 +119,50 @@ class FeatureToTextConverter:
 """
         return prompt
     
+    @staticmethod
+    def _generate_structured_prompt(features_text):
+        return f"""
+你是一位专业的眼科医生，专门负责糖尿病视网膜病变的诊断。请根据以下眼底图像分析报告，给出专业的诊断意见。
+
+{features_text}
+
+请以JSON格式回答，字段如下：
+- result：诊断结果，取值为{'/'.join(FeatureToTextConverter.DIAGNOSIS_RESULTS)}之一
+- analysis：详细分析，说明血管、视盘、黄斑区以及各种病变的发现情况
+- risk_level：风险评估，取值为{'/'.join(FeatureToTextConverter.RISK_LEVELS)}之一
+- recommendations：医疗建议列表，包括是否需要进一步检查、治疗方案建议、随访频率等
+
+请用中文回答，保持专业和准确。
+"""
+    
+    @staticmethod
+    def parse_structured_diagnosis(response):
+        """解析按DIAGNOSIS_SCHEMA输出的JSON，返回与extract_diagnosis_from_response相同的结构
+        
+        不是合法JSON时（模型不支持format参数等）退回自由文本解析。
+        """
+        try:
+            data = json.loads(response)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return FeatureToTextConverter.extract_diagnosis_from_response(response)
+        
+        recommendations = data.get('recommendations') or []
+        if isinstance(recommendations, str):
+            recommendations = recommendations.split('。')
+        
+        diagnosis = {
+            'result': data.get('result') or '未知',
+            'risk_level': data.get('risk_level') or '未知',
+            'analysis': {},
+            'recommendations': [str(rec).strip() for rec in recommendations if str(rec).strip()]
+        }
+        if data.get('analysis'):
+            diagnosis['analysis']['full_analysis'] = str(data['analysis']).strip()
+        
+        return diagnosis
+    
     @staticmethod
     def extract_diagnosis_from_response(response):
         import re
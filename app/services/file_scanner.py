@@ -0,0 +1,89 @@
+import fnmatch
+import os
+
+class FileScanner:
+    """基于os.scandir的惰性目录扫描器
+
+    利用DirEntry自带的类型信息，避免对每个条目额外stat，
+    发现一个文件就产出一个，处理可以在扫描完成前开始。
+    """
+
+    def __init__(self, extensions, include=None, exclude=None, max_depth=None, sort=False):
+        self.extensions = {ext.lower() for ext in extensions}
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+        # None表示不限深度，0表示只扫描顶层目录
+        self.max_depth = max_depth
+        # 按文件名排序产出；需要先读出整个目录，默认按列举顺序边读边产出
+        self.sort = sort
+
+    def scan(self, folder_path):
+        """逐个产出匹配的文件路径"""
+        stack = [(folder_path, 0)]
+
+        while stack:
+            directory, depth = stack.pop()
+            subdirectories = []
+            for entry in self._iter_entries(directory):
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.max_depth is None or depth < self.max_depth:
+                            if not self._is_excluded(entry.path, folder_path):
+                                subdirectories.append(entry.path)
+                    elif entry.is_file() and self._matches(entry, folder_path):
+                        yield entry.path
+                except OSError:
+                    continue
+
+            # 倒序入栈，保证子目录按列举顺序处理
+            for subdirectory in reversed(subdirectories):
+                stack.append((subdirectory, depth + 1))
+
+    def _iter_entries(self, directory):
+        """逐个产出目录条目，目录无法读取时不产出
+
+        处理方可能在遍历过程中重命名已产出的文件，新文件名可能再次出现在同一次列举中；
+        重命名不改变inode，按inode跳过已产出过的条目。
+        """
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name) if self.sort else it
+                seen = set()
+                for entry in entries:
+                    try:
+                        inode = entry.inode()
+                    except OSError:
+                        continue
+                    # 部分文件系统不提供inode（为0），此时不去重
+                    if inode:
+                        if inode in seen:
+                            continue
+                        seen.add(inode)
+                    yield entry
+        except OSError:
+            return
+
+    def _matches(self, entry, folder_path):
+        if os.path.splitext(entry.name)[1].lower() not in self.extensions:
+            return False
+
+        if self._is_excluded(entry.path, folder_path):
+            return False
+
+        if self.include:
+            return self._match_any(self.include, entry.path, folder_path)
+
+        return True
+
+    def _is_excluded(self, path, folder_path):
+        return bool(self.exclude) and self._match_any(self.exclude, path, folder_path)
+
+    @staticmethod
+    def _match_any(patterns, path, folder_path):
+        """模式同时匹配文件名和相对于扫描根目录的路径"""
+        name = os.path.basename(path)
+        relative_path = os.path.relpath(path, folder_path).replace(os.sep, '/')
+        return any(
+            fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern)
+            for pattern in patterns
+        )
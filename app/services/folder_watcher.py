@@ -0,0 +1,305 @@
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from app.services.batch_processor import BatchProcessor
+from app.services.batch_pipeline import IDLE
+from app.services.file_scanner import FileScanner
+
+# watchdog为可选依赖，安装后使用inotify等系统通知，否则退化为轮询
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+class _WatchEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.observe(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.observe(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.observe(event.dest_path)
+
+
+class FolderWatcher:
+    """持续监视文件夹，把写入完成的新图片送入批处理流水线
+
+    文件在settle_seconds内大小和修改时间都不再变化才视为写入完成，
+    避免处理相机仍在写入的半截文件。
+    """
+
+    def __init__(self, folder_path, options, processor_factory=BatchProcessor,
+                 poll_interval=2.0, settle_seconds=3.0, history_size=200):
+        self.watch_id = uuid.uuid4().hex
+        self.folder_path = folder_path
+        self.options = options
+        self.processor_factory = processor_factory
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.mode = self._select_mode(options.get('mode', 'auto'))
+        self.status = 'created'
+        self.error = None
+        self.started_at = None
+        self.detected_files = 0
+        self.success_files = 0
+        self.error_files = 0
+        self.recent_results = deque(maxlen=history_size)
+
+        self._scanner = FileScanner(
+            BatchProcessor.SUPPORTED_EXTENSIONS,
+            include=options.get('include'),
+            exclude=options.get('exclude'),
+            max_depth=0 if not options.get('recursive', True) else options.get('max_depth')
+        )
+        # 路径 -> (文件签名, 签名最近一次变化的时间)
+        self._candidates = {}
+        # 已经处理或忽略的文件：路径 -> 文件签名
+        self._known = {}
+        # 本监视器重命名产生的文件，再次出现时不重复处理
+        self._produced = set()
+        self._ready = queue.Queue()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._observer = None
+        self._threads = []
+
+    def start(self):
+        self.started_at = time.time()
+        self.status = 'running'
+
+        # 默认只处理启动后新出现的文件，已有文件同样要经过静默期判断
+        for image_path in self._scanner.scan(self.folder_path):
+            if self.options.get('process_existing', False):
+                self.observe(image_path)
+            else:
+                self._known[image_path] = self._signature(image_path)
+
+        if self.mode == 'inotify':
+            self._observer = Observer()
+            self._observer.schedule(_WatchEventHandler(self), self.folder_path,
+                                    recursive=self.options.get('recursive', True))
+            self._observer.start()
+
+        for target in (self._watch_loop, self._process_loop):
+            thread = threading.Thread(target=target, name=f'folder-watch-{self.watch_id[:8]}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, wait=True, on_stopped=None):
+        """停止接收新文件；在途文件处理完成后状态变为stopped
+
+        wait为False时立即返回，状态为stopping，由后台线程等待在途文件完成后调用on_stopped。
+        """
+        self._stop_event.set()
+        if self._observer is not None:
+            self._observer.stop()
+        if self.status == 'running':
+            self.status = 'stopping'
+
+        if wait:
+            self._join(on_stopped)
+        else:
+            threading.Thread(target=self._join, args=(on_stopped,),
+                             name=f'folder-watch-stop-{self.watch_id[:8]}', daemon=True).start()
+
+    def _join(self, on_stopped=None):
+        for thread in self._threads:
+            thread.join()
+        if self.status == 'stopping':
+            self.status = 'stopped'
+        if on_stopped is not None:
+            on_stopped(self)
+
+    def observe(self, image_path):
+        """登记一次文件变化，重置该文件的静默计时"""
+        signature = self._signature(image_path)
+        if signature is None:
+            return
+
+        with self._lock:
+            if image_path in self._produced:
+                self._produced.discard(image_path)
+                self._known[image_path] = signature
+                return
+
+            if self._known.get(image_path) == signature:
+                return
+
+            previous = self._candidates.get(image_path)
+            if previous is None or previous[0] != signature:
+                self._candidates[image_path] = (signature, time.time())
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'watch_id': self.watch_id,
+                'folder_path': self.folder_path,
+                'mode': self.mode,
+                'status': self.status,
+                'error': self.error,
+                'started_at': self.started_at,
+                'pending_files': len(self._candidates) + self._ready.qsize(),
+                'detected_files': self.detected_files,
+                'success_files': self.success_files,
+                'error_files': self.error_files,
+                'recent_results': list(self.recent_results)
+            }
+
+    def _watch_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                if self.mode == 'poll':
+                    self._poll()
+                self._release_settled()
+            except Exception as e:
+                self.error = str(e)
+            self._stop_event.wait(self.poll_interval)
+
+    def _poll(self):
+        """轮询模式：扫描文件夹，登记新出现或发生变化的文件"""
+        present = set()
+        for image_path in self._scanner.scan(self.folder_path):
+            present.add(image_path)
+            self.observe(image_path)
+
+        # 已删除或被重命名走的文件不再跟踪
+        with self._lock:
+            for image_path in list(self._known):
+                if image_path not in present:
+                    del self._known[image_path]
+
+    def _release_settled(self):
+        """大小和修改时间在静默期内未变化的文件送入处理队列"""
+        now = time.time()
+        with self._lock:
+            candidates = list(self._candidates.items())
+
+        for image_path, (signature, changed_at) in candidates:
+            if now - changed_at < self.settle_seconds:
+                continue
+
+            current = self._signature(image_path)
+            with self._lock:
+                if image_path in self._produced:
+                    # 重命名事件可能早于处理结果到达
+                    self._produced.discard(image_path)
+                    self._candidates.pop(image_path, None)
+                    self._known[image_path] = current
+                elif current is None:
+                    self._candidates.pop(image_path, None)
+                elif current != signature:
+                    self._candidates[image_path] = (current, now)
+                elif current[0] > 0:
+                    del self._candidates[image_path]
+                    self._known[image_path] = current
+                    self.detected_files += 1
+                    self._ready.put(image_path)
+
+    def _iter_ready(self):
+        """持续产出待处理文件，暂时没有文件时产出IDLE"""
+        while not self._stop_event.is_set():
+            try:
+                image_path = self._ready.get(timeout=0.2)
+            except queue.Empty:
+                yield IDLE
+                continue
+            yield image_path
+
+    def _process_loop(self):
+        try:
+            batch_processor = self.processor_factory()
+            for image_path, result in batch_processor.iter_process_items(self._iter_ready(), self.options):
+                self._record_result(image_path, result)
+        except Exception as e:
+            self.error = str(e)
+            self.status = 'failed'
+
+    def _record_result(self, image_path, result):
+        with self._lock:
+            if result['status'] == 'success':
+                self.success_files += 1
+                self._produced.add(os.path.join(os.path.dirname(image_path), result['new_name']))
+            else:
+                self.error_files += 1
+            self.recent_results.append(result)
+
+    def _select_mode(self, mode):
+        if mode == 'auto':
+            return 'inotify' if Observer is not None else 'poll'
+        if mode == 'inotify' and Observer is None:
+            raise Exception('inotify监视需要安装watchdog，可使用mode=poll')
+        return mode
+
+    @staticmethod
+    def _signature(image_path):
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+
+class WatchManager:
+    """管理正在运行的文件夹监视器"""
+
+    def __init__(self, poll_interval=2.0, settle_seconds=3.0, processor_factory=BatchProcessor):
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.processor_factory = processor_factory
+        self._watchers = {}
+        self._lock = threading.Lock()
+
+    def start(self, folder_path, options):
+        watcher = FolderWatcher(
+            folder_path,
+            options,
+            processor_factory=self.processor_factory,
+            poll_interval=options.get('poll_interval', self.poll_interval),
+            settle_seconds=options.get('settle_seconds', self.settle_seconds)
+        )
+        watcher.start()
+
+        with self._lock:
+            self._watchers[watcher.watch_id] = watcher
+        return watcher
+
+    def get(self, watch_id):
+        with self._lock:
+            return self._watchers.get(watch_id)
+
+    def list_watchers(self):
+        with self._lock:
+            watchers = list(self._watchers.values())
+        return [watcher.to_dict() for watcher in watchers]
+
+    def stop(self, watch_id):
+        """通知监视器停止并立即返回，在途文件处理完成前仍可查询到stopping状态"""
+        with self._lock:
+            watcher = self._watchers.get(watch_id)
+        if watcher is not None:
+            watcher.stop(wait=False, on_stopped=self._remove)
+        return watcher
+
+    def _remove(self, watcher):
+        with self._lock:
+            if self._watchers.get(watcher.watch_id) is watcher:
+                del self._watchers[watcher.watch_id]
+
+    def stop_all(self):
+        with self._lock:
+            watchers = list(self._watchers.values())
+            self._watchers.clear()
+        for watcher in watchers:
+            watcher.stop()
@@ -1,8 +1,10 @@
-from PIL import Image
+from PIL import Image, ImageOps
 import numpy as np
 import os
 import base64
 from io import BytesIO
+from app.services.text_region import detect_text_regions, union_box
+from app.services.layout_cache import LayoutCache, get_default_layout_cache
 
 class ImageProcessor:
     @staticmethod
@@ -35,6 +37,92 @@ class ImageProcessor:
         with open(image_path, 'rb') as image_file:
             return base64.b64encode(image_file.read()).decode('utf-8')
     
+    @staticmethod
+    def encode_for_vlm(image_path, max_side=None, jpeg_quality=None, crop_box=None):
+        """为视觉大模型准备图片的base64编码
+        
+        crop_box为(左, 上, 右, 下)相对坐标，只保留印有姓名和日期的区域，
+        为'auto'时按同一相机已学习或检测到的文字区域裁剪，找不到时不裁剪；
+        长边超过max_side时等比缩小，之后重新编码为JPEG。带EXIF方向的图片先按方向摆正。
+        无需裁剪、缩小和摆正的JPEG文件直接编码原始字节。
+        """
+        try:
+            img = Image.open(image_path)
+            orientation = img.getexif().get(0x0112, 1)
+        except Exception:
+            # Pillow无法识别的文件原样发送，由模型端处理
+            return ImageProcessor.image_to_base64(image_path)
+        
+        if crop_box == 'auto':
+            crop_box = union_box(ImageProcessor.locate_text_regions_in_file(image_path))
+        
+        needs_resize = bool(max_side) and max(img.size) > max_side
+        needs_transpose = orientation not in (None, 1)
+        if not crop_box and not needs_resize and not needs_transpose and (img.format == 'JPEG' or not jpeg_quality):
+            return ImageProcessor.image_to_base64(image_path)
+        
+        if max_side:
+            # JPEG在解码时直接按比例缩小，避免解码完整分辨率；裁剪时保证裁出的区域仍不小于max_side
+            scale = min(crop_box[2] - crop_box[0], crop_box[3] - crop_box[1]) if crop_box else 1.0
+            requested = int(max_side / max(scale, 1e-3)) + 1
+            img.draft('RGB', (requested, requested))
+        
+        if needs_transpose:
+            img = ImageOps.exif_transpose(img)
+        
+        if crop_box:
+            left, top, right, bottom = crop_box
+            img = img.crop((
+                int(img.width * left), int(img.height * top),
+                int(img.width * right), int(img.height * bottom)
+            ))
+        
+        if max_side and max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=jpeg_quality or 90)
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+    
+    @staticmethod
+    def locate_text_regions_in_file(image_path, detect_side=800):
+        """在按EXIF方向摆正、解码时缩小的灰度图上定位文字区域，返回相对坐标"""
+        try:
+            with Image.open(image_path) as img:
+                size = ImageProcessor.oriented_size(img)
+                # 只解码亮度并按比例缩小，检测本身也只在长边detect_side的图上进行
+                img.draft('L', (detect_side, detect_side))
+                gray = np.asarray(ImageOps.exif_transpose(img).convert('L'))
+        except Exception:
+            return []
+        
+        return ImageProcessor.locate_text_regions(image_path, gray, size)
+    
+    @staticmethod
+    def oriented_size(img):
+        """按EXIF方向摆正后的原图(宽, 高)，需在draft之前调用"""
+        width, height = img.size
+        if img.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            return height, width
+        return width, height
+    
+    @staticmethod
+    def locate_text_regions(image_path, gray, size=None):
+        """优先使用同一相机已学习的文字区域，没有时在图片中检测
+        
+        gray为缩小后的图片时，size给出原图(宽, 高)，与OCR阶段学习到的区域使用同一签名。
+        """
+        layout_cache = get_default_layout_cache()
+        if layout_cache is not None:
+            layout = layout_cache.get(LayoutCache.signature(image_path, gray, size=size))
+            if layout:
+                return layout
+        
+        return detect_text_regions(gray)
+    
     @staticmethod
     def get_image_info(image_path):
         img = Image.open(image_path)
@@ -0,0 +1,209 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.services.batch_processor import BatchProcessor
+from app.services.deadline import CancelToken
+
+class BatchJob:
+    """后台批量处理任务，记录进度、逐文件结果和吞吐量"""
+
+    def __init__(self, job_id, folder_path, options):
+        self.job_id = job_id
+        self.folder_path = folder_path
+        self.options = options
+        self.status = 'queued'
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.total_files = 0
+        self.scan_complete = False
+        self.processed_files = 0
+        self.success_files = 0
+        self.error_files = 0
+        self.timeout_files = 0
+        self.skipped_files = 0
+        self.files = []
+        self.plan_id = None
+        self.cancel_token = CancelToken()
+        self._lock = threading.Lock()
+
+    def mark_running(self):
+        with self._lock:
+            if self.status == 'queued':
+                self.status = 'running'
+            self.started_at = time.time()
+
+    def cancel(self):
+        """请求取消任务，正在处理的文件结束或超时后任务停止"""
+        with self._lock:
+            if self.status in ('queued', 'running'):
+                self.status = 'cancelling'
+        self.cancel_token.cancel()
+
+    def track_discovery(self, image_files):
+        """边扫描边统计已发现的文件数，扫描结束前总数只是下限"""
+        for image_path in image_files:
+            with self._lock:
+                self.total_files += 1
+            yield image_path
+
+        with self._lock:
+            self.scan_complete = True
+
+    def record_result(self, result):
+        with self._lock:
+            self.files.append(result)
+            self.processed_files += 1
+            status = result.get('status')
+            if status == 'success':
+                self.success_files += 1
+            elif status == 'timeout':
+                self.timeout_files += 1
+            elif status == 'skipped':
+                self.skipped_files += 1
+            else:
+                self.error_files += 1
+
+    def mark_finished(self, status, error=None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+
+    def is_finished(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def get_files(self, offset=0, limit=None):
+        """分页返回已完成文件的处理结果"""
+        with self._lock:
+            end = None if limit is None else offset + limit
+            return list(self.files[offset:end])
+
+    def to_dict(self):
+        with self._lock:
+            elapsed = 0.0
+            if self.started_at:
+                elapsed = (self.finished_at or time.time()) - self.started_at
+
+            # 吞吐量和剩余时间估算
+            files_per_second = self.processed_files / elapsed if elapsed > 0 else 0.0
+            remaining = max(self.total_files - self.processed_files, 0)
+            eta_seconds = None
+            if self.status == 'running' and self.scan_complete and files_per_second > 0:
+                eta_seconds = round(remaining / files_per_second, 1)
+
+            progress = 0.0
+            if self.total_files:
+                progress = round(self.processed_files / self.total_files * 100, 1)
+
+            return {
+                'job_id': self.job_id,
+                'folder_path': self.folder_path,
+                'status': self.status,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'total_files': self.total_files,
+                'scan_complete': self.scan_complete,
+                'processed_files': self.processed_files,
+                'success_files': self.success_files,
+                'error_files': self.error_files,
+                'timeout_files': self.timeout_files,
+                'skipped_files': self.skipped_files,
+                'progress': progress,
+                'elapsed_seconds': round(elapsed, 1),
+                'files_per_second': round(files_per_second, 3),
+                'eta_seconds': eta_seconds,
+                'plan_id': self.plan_id
+            }
+
+
+class JobManager:
+    """管理后台批量处理任务，多个文件夹可以同时排队处理"""
+
+    def __init__(self, max_workers=2, max_history=100, processor_factory=BatchProcessor):
+        self.max_history = max_history
+        self.processor_factory = processor_factory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, folder_path, options):
+        """创建任务并放入后台队列，立即返回任务对象"""
+        job = BatchJob(uuid.uuid4().hex, folder_path, options)
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune_history()
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in jobs]
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job):
+        # 排队期间已被取消的任务不再启动
+        if job.cancel_token.is_cancelled():
+            job.mark_finished('cancelled')
+            return
+
+        try:
+            batch_processor = self.processor_factory()
+
+            error = batch_processor.validate_folder(job.folder_path)
+            if error:
+                job.mark_finished('failed', error)
+                return
+
+            image_files = batch_processor.collect_image_files(job.folder_path, job.options)
+            image_files = job.track_discovery(image_files)
+            job.mark_running()
+
+            # 预览任务只生成重命名计划，完成后通过计划ID确认执行
+            if job.options.get('preview', False):
+                job.plan_id, results = batch_processor.preview_files(
+                    job.folder_path, image_files, job.options, job.cancel_token)
+                for result in results:
+                    job.record_result(result)
+                job.mark_finished(self._final_status(job))
+                return
+
+            journal = batch_processor.open_journal(job.folder_path, job.options)
+            for result in batch_processor.iter_process(image_files, job.options, journal, job.cancel_token):
+                job.record_result(result)
+
+            job.mark_finished(self._final_status(job))
+
+        except Exception as e:
+            job.mark_finished('failed', str(e))
+
+    @staticmethod
+    def _final_status(job):
+        return 'cancelled' if job.cancel_token.is_cancelled() else 'completed'
+
+    def _prune_history(self):
+        """只保留最近的已结束任务，避免内存无限增长"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished()]
+        overflow = len(self._jobs) - self.max_history
+        for job_id in finished[:max(overflow, 0)]:
+            del self._jobs[job_id]
@@ -0,0 +1,153 @@
+import json
+import sqlite3
+import time
+import numpy as np
+from PIL import Image
+from app.services.lazy_instance import LazyInstance
+from app.services.sqlite_store import SqliteStore
+from config import Config
+
+class LayoutCache(SqliteStore):
+    """按相机学习姓名和日期文字区域的位置
+
+    同一型号相机拍摄的图片分辨率和叠加文字的位置相同。以图片签名（尺寸、EXIF相机型号、
+    四边边框的灰度分布）为键，记录上次同时识别出姓名和日期的文字区域，之后的图片先识别该区域，
+    未命中时再做完整的文字区域检测；连续未命中max_misses次的版面被删除。
+    结果保存在SQLite中，在多次运行和OCR工作进程之间共享。
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS overlay_layouts (
+            signature TEXT PRIMARY KEY,
+            boxes TEXT NOT NULL,
+            hits INTEGER NOT NULL,
+            consecutive_misses INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    '''
+
+    def __init__(self, db_path, max_misses=3):
+        super().__init__(db_path)
+        self.max_misses = max_misses
+        self.hits = 0
+        self.misses = 0
+        self._layouts = {}
+
+    @staticmethod
+    def signature(image_path, gray, border=0.05, bins=4, size=None):
+        """由尺寸、EXIF相机厂商和型号、四边边框的粗粒度灰度直方图组成的签名
+
+        gray为解码时缩小的图片时，size给出原图(宽, 高)，采样间隔按比例缩小，与原图得到相同签名。
+        """
+        height, width = gray.shape[:2]
+        step = 4
+        if size is not None:
+            step = max(int(round(4 * width / size[0])), 1)
+            width, height = size
+
+        camera = ''
+        try:
+            with Image.open(image_path) as img:
+                exif = img.getexif()
+                camera = f"{exif.get(0x010F, '')} {exif.get(0x0110, '')}".strip()
+        except Exception:
+            pass
+
+        # 隔行隔列采样，边框区域的灰度分布量化到0.25，同一相机的图片得到相同结果
+        sample = gray[::step, ::step]
+        band_h = max(int(sample.shape[0] * border), 1)
+        band_w = max(int(sample.shape[1] * border), 1)
+        histograms = []
+        for strip in (sample[:band_h], sample[-band_h:], sample[:, :band_w], sample[:, -band_w:]):
+            counts, _ = np.histogram(strip, bins=bins, range=(0, 256))
+            histograms.append(''.join(str(int(round(count / strip.size * 4))) for count in counts))
+
+        return f"{width}x{height}|{camera}|{'-'.join(histograms)}"
+
+    def get(self, signature):
+        """返回该签名已学习的文字区域[(左, 上, 右, 下)]，没有时返回None"""
+        with self._lock:
+            if signature in self._layouts:
+                return self._layouts[signature]
+            try:
+                row = self._conn.execute('SELECT boxes FROM overlay_layouts WHERE signature = ?', (signature,)).fetchone()
+            except sqlite3.Error:
+                return None
+            if row is None:
+                return None
+            boxes = [tuple(box) for box in json.loads(row[0])]
+            self._layouts[signature] = boxes
+            return boxes
+
+    def learn(self, signature, boxes):
+        """记录完整检测后识别成功的文字区域
+
+        姓名长短不同，文字区域的宽度随之变化，记录时横向各扩展半个区域宽度、纵向各扩展四分之一高度。
+        """
+        boxes = [self._expand(box) for box in boxes]
+        with self._lock:
+            self._layouts[signature] = boxes
+            self._execute('''
+                INSERT INTO overlay_layouts (signature, boxes, hits, consecutive_misses, updated_at) VALUES (?, ?, 0, 0, ?)
+                ON CONFLICT(signature) DO UPDATE SET
+                    boxes = excluded.boxes, consecutive_misses = 0, updated_at = excluded.updated_at
+            ''', (signature, json.dumps(boxes), time.time()))
+
+    def record(self, signature, hit):
+        """记录已学习的版面是否命中，连续未命中过多时删除"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self._execute('UPDATE overlay_layouts SET hits = hits + 1, consecutive_misses = 0 WHERE signature = ?',
+                              (signature,))
+                return
+
+            self.misses += 1
+            self._execute('UPDATE overlay_layouts SET consecutive_misses = consecutive_misses + 1 WHERE signature = ?',
+                          (signature,))
+            self._execute('DELETE FROM overlay_layouts WHERE signature = ? AND consecutive_misses >= ?',
+                          (signature, self.max_misses))
+            try:
+                row = self._conn.execute('SELECT 1 FROM overlay_layouts WHERE signature = ?', (signature,)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is None:
+                self._layouts.pop(signature, None)
+
+    @staticmethod
+    def _expand(box):
+        left, top, right, bottom = box
+        pad_x = (right - left) / 2
+        pad_y = (bottom - top) / 4
+        return (max(left - pad_x, 0.0), max(top - pad_y, 0.0), min(right + pad_x, 1.0), min(bottom + pad_y, 1.0))
+
+    def stats(self):
+        """版面数和命中次数取自SQLite，包含所有OCR工作进程；process中的计数只包含当前进程"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            try:
+                layouts, hits, misses = self._conn.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(hits), 0), COALESCE(SUM(consecutive_misses), 0) FROM overlay_layouts'
+                ).fetchone()
+            except sqlite3.Error:
+                layouts, hits, misses = len(self._layouts), None, None
+            return {
+                'layouts': layouts,
+                'hits': hits,
+                'consecutive_misses': misses,
+                'process': {
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+                }
+            }
+
+
+_default_layout_cache = LazyInstance(
+    lambda: LayoutCache(Config.LAYOUT_CACHE_PATH, max_misses=Config.LAYOUT_CACHE_MAX_MISSES))
+
+def get_default_layout_cache():
+    """按配置创建进程内共享的版面缓存，未启用时返回None；应用内通过ServiceRegistry取得"""
+    if not Config.LAYOUT_CACHE_ENABLED:
+        return None
+    return _default_layout_cache.get()
@@ -0,0 +1,25 @@
+import threading
+
+class LazyInstance:
+    """进程内按需创建一次的共享实例
+
+    首次get()时调用factory创建，多个线程同时首次使用时只创建一个。
+    OCR工作进程没有Flask应用和ServiceRegistry，各自通过它取得本进程的实例。
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._instance is None:
+                self._instance = self._factory()
+            return self._instance
+
+    def reset(self):
+        """丢弃当前实例并返回它（未创建时为None），由调用方负责关闭"""
+        with self._lock:
+            instance, self._instance = self._instance, None
+            return instance
@@ -0,0 +1,98 @@
+import sqlite3
+import time
+import cv2
+from app.services.ocr_engine import get_ocr_engine
+from app.services.lazy_instance import LazyInstance
+from app.services.sqlite_store import SqliteStore
+from config import Config
+
+# OCR前的预处理方式，按需逐个生成；默认顺序即没有历史统计时的尝试顺序
+PREPROCESSING_VARIANTS = {
+    'thresh': lambda gray: cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1],
+    'blur': lambda gray: cv2.GaussianBlur(gray, (5, 5), 0),
+    'adaptive': lambda gray: cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2),
+    'median': lambda gray: cv2.medianBlur(gray, 3)
+}
+
+def run_ocr_variant(method_name, gray, timeout=0):
+    """生成一种预处理图片并识别，返回[(行文本, 平均置信度)]"""
+    processed_image = PREPROCESSING_VARIANTS[method_name](gray)
+    return get_ocr_engine().read_lines(processed_image, lang='chi_sim+eng', timeout=timeout)
+
+class OcrVariantStats(SqliteStore):
+    """各预处理方式的历史识别结果
+
+    每次OCR后记录是否识别出姓名和日期，保存在SQLite中，进程池中的OCR工作进程共享同一份统计；
+    排序结果在内存中缓存refresh_interval秒。
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS ocr_variant_stats (
+            variant TEXT PRIMARY KEY,
+            attempts INTEGER NOT NULL,
+            name_hits INTEGER NOT NULL,
+            date_hits INTEGER NOT NULL
+        );
+    '''
+
+    def __init__(self, db_path, refresh_interval=30.0):
+        super().__init__(db_path)
+        self.refresh_interval = refresh_interval
+        self._ranked = None
+        self._ranked_at = 0
+
+    def record(self, variant, name_found, date_found):
+        with self._lock:
+            self._execute('''
+                INSERT INTO ocr_variant_stats (variant, attempts, name_hits, date_hits) VALUES (?, 1, ?, ?)
+                ON CONFLICT(variant) DO UPDATE SET
+                    attempts = attempts + 1,
+                    name_hits = name_hits + excluded.name_hits,
+                    date_hits = date_hits + excluded.date_hits
+            ''', (variant, int(bool(name_found)), int(bool(date_found))))
+
+    def rank(self, variants):
+        """按成功率从高到低排序，成功率相同时保持原有顺序"""
+        with self._lock:
+            if self._ranked is None or time.time() - self._ranked_at >= self.refresh_interval:
+                self._ranked = self._load_rates()
+                self._ranked_at = time.time()
+            rates = self._ranked
+
+        return sorted(variants, key=lambda variant: -rates.get(variant, 0.5))
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT variant, attempts, name_hits, date_hits FROM ocr_variant_stats ORDER BY variant'
+            ).fetchall()
+        return [{
+            'variant': variant,
+            'attempts': attempts,
+            'name_hits': name_hits,
+            'date_hits': date_hits,
+            'success_rate': round(self._success_rate(attempts, name_hits, date_hits), 4)
+        } for variant, attempts, name_hits, date_hits in rows]
+
+    def _load_rates(self):
+        try:
+            rows = self._conn.execute('SELECT variant, attempts, name_hits, date_hits FROM ocr_variant_stats').fetchall()
+        except sqlite3.Error:
+            return {}
+        return {variant: self._success_rate(attempts, name_hits, date_hits)
+                for variant, attempts, name_hits, date_hits in rows}
+
+    @staticmethod
+    def _success_rate(attempts, name_hits, date_hits):
+        # 加一平滑，尝试次数少的方式不会因为一两次结果排到最前或最后
+        return (name_hits + date_hits + 1) / (2 * attempts + 2)
+
+
+_default_stats = LazyInstance(lambda: OcrVariantStats(Config.OCR_STATS_PATH))
+
+def get_default_ocr_stats():
+    """按配置创建进程内共享的统计实例，未启用时返回None；应用内通过ServiceRegistry取得"""
+    if not Config.OCR_STATS_ENABLED:
+        return None
+    return _default_stats.get()
+
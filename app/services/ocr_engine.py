@@ -0,0 +1,170 @@
+import queue
+import re
+import threading
+import numpy as np
+import pytesseract
+from app.services.lazy_instance import LazyInstance
+from config import Config
+
+# tesserocr为可选依赖：进程内直接调用libtesseract，识别模型只加载一次
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+_CJK_TOKEN = re.compile(r'^[\u4e00-\u9fa5：:]+$')
+
+def join_words(words):
+    """中文按字切分的词直接相连，其余以空格分隔，与image_to_string的输出一致"""
+    text = ''
+    for word in words:
+        if text and not (_CJK_TOKEN.match(word) and _CJK_TOKEN.match(text[-1])):
+            text += ' '
+        text += word
+    return text
+
+def to_pixels(image):
+    """将OpenCV数组或PIL图片转换为连续的uint8像素数组"""
+    if not isinstance(image, np.ndarray):
+        if image.mode not in ('L', 'RGB', 'RGBA'):
+            image = image.convert('RGB')
+        image = np.asarray(image)
+    if image.dtype != np.uint8:
+        image = image.astype(np.uint8)
+    return np.ascontiguousarray(image)
+
+class PytesseractEngine:
+    """每次调用启动一个tesseract进程，未安装tesserocr时使用"""
+
+    name = 'pytesseract'
+
+    def image_to_string(self, image, lang='chi_sim+eng', psm=None, timeout=0):
+        config = f'--psm {psm}' if psm is not None else ''
+        return pytesseract.image_to_string(image, lang=lang, config=config, timeout=timeout)
+
+    def read_lines(self, image, lang='chi_sim+eng', psm=None, timeout=0):
+        """识别图片中的文字，返回[(行文本, 平均置信度)]，置信度为0-100"""
+        config = f'--psm {psm}' if psm is not None else ''
+        data = pytesseract.image_to_data(image, lang=lang, config=config, timeout=timeout,
+                                         output_type=pytesseract.Output.DICT)
+
+        lines = {}
+        for i, word in enumerate(data['text']):
+            word = (word or '').strip()
+            confidence = float(data['conf'][i])
+            if not word or confidence < 0:
+                continue
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append((word, confidence))
+
+        return [(join_words([word for word, _ in words]), sum(conf for _, conf in words) / len(words))
+                for _, words in sorted(lines.items())]
+
+    def warmup(self, lang='chi_sim+eng'):
+        pass
+
+class TesserocrEngine:
+    """进程内的Tesseract引擎池
+
+    每种(语言, 分页模式)保留一组已加载识别模型的PyTessBaseAPI，调用时取出一个空闲实例，
+    用完放回；像素直接通过SetImageBytes传入，不再写临时文件。
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def image_to_string(self, image, lang='chi_sim+eng', psm=None, timeout=0):
+        with self._engine(lang, psm) as api:
+            self._recognize(api, image, timeout)
+            return api.GetUTF8Text()
+
+    def read_lines(self, image, lang='chi_sim+eng', psm=None, timeout=0):
+        """返回值与PytesseractEngine.read_lines相同"""
+        with self._engine(lang, psm) as api:
+            self._recognize(api, image, timeout)
+
+            lines = []
+            level = tesserocr.RIL.WORD
+            for word_iter in tesserocr.iterate_level(api.GetIterator(), level):
+                word = (word_iter.GetUTF8Text(level) or '').strip()
+                confidence = word_iter.Confidence(level)
+                if word_iter.IsAtBeginningOf(tesserocr.RIL.TEXTLINE) or not lines:
+                    lines.append([])
+                if word and confidence >= 0:
+                    lines[-1].append((word, confidence))
+
+        return [(join_words([word for word, _ in words]), sum(conf for _, conf in words) / len(words))
+                for words in lines if words]
+
+    def warmup(self, lang='chi_sim+eng'):
+        """预先创建一个引擎实例，加载识别模型"""
+        with self._engine(lang, None):
+            pass
+
+    def _engine(self, lang, psm):
+        return _PooledEngine(self, (lang, psm))
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.setdefault(key, queue.LifoQueue())
+        try:
+            return idle.get_nowait()
+        except queue.Empty:
+            lang, psm = key
+            return tesserocr.PyTessBaseAPI(lang=lang, psm=tesserocr.PSM.AUTO if psm is None else psm)
+
+    def _release(self, key, api):
+        # 清除图片和识别结果，保留已加载的模型
+        api.Clear()
+        self._idle[key].put(api)
+
+    @staticmethod
+    def _recognize(api, image, timeout):
+        pixels = to_pixels(image)
+        height, width = pixels.shape[:2]
+        channels = 1 if pixels.ndim == 2 else pixels.shape[2]
+        api.SetImageBytes(pixels.tobytes(), width, height, channels, width * channels)
+        # 与pytesseract一致，timeout以秒为单位，0表示不限时
+        if not api.Recognize(int(timeout * 1000)):
+            raise RuntimeError('Tesseract process timeout')
+
+class _PooledEngine:
+    def __init__(self, pool, key):
+        self.pool = pool
+        self.key = key
+        self.api = None
+
+    def __enter__(self):
+        self.api = self.pool._acquire(self.key)
+        return self.api
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pool._release(self.key, self.api)
+
+
+def _create_ocr_engine():
+    if Config.OCR_ENGINE == 'tesserocr' and tesserocr is None:
+        raise Exception('OCR_ENGINE为tesserocr，但未安装tesserocr')
+    if Config.OCR_ENGINE != 'pytesseract' and tesserocr is not None:
+        return TesserocrEngine()
+    return PytesseractEngine()
+
+_default_engine = LazyInstance(_create_ocr_engine)
+
+def get_ocr_engine():
+    """返回进程内共享的OCR引擎
+
+    OCR_ENGINE为auto时安装了tesserocr就使用进程内引擎，否则使用pytesseract；
+    进程池中的每个OCR工作进程各自持有一个引擎池。
+    """
+    return _default_engine.get()
+
+def warmup_ocr_engine(lang='chi_sim+eng'):
+    """OCR进程池的initializer：工作进程启动时加载识别模型，首个文件不必等待"""
+    try:
+        get_ocr_engine().warmup(lang)
+    except Exception as e:
+        print(f'警告: OCR引擎预热失败: {e}')
@@ -1,110 +1,375 @@
 import requests
+import hashlib
 import json
-import base64
+import random
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from requests.adapters import HTTPAdapter
+from app.services.image_processor import ImageProcessor
+from app.services.endpoint_pool import EndpointPool
+from app.services.circuit_breaker import CircuitBreaker
+from config import Config
+
+class OllamaError(Exception):
+    """Ollama调用失败
+
+    status_code为HTTP状态码，连接失败或超时时为None；
+    retryable表示该错误是否属于可重试的瞬时故障。
+    """
+
+    def __init__(self, message, status_code=None, retryable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+
+class CircuitOpenError(OllamaError):
+    """熔断器处于打开状态，请求未发送"""
+    pass
+
 
 class OllamaClient:
-    def __init__(self, base_url='http://localhost:11434', model='llava'):
-        self.base_url = base_url
+    # 服务端过载或重启时返回的状态码，可以重试
+    RETRYABLE_STATUS = {500, 502, 503, 504}
+
+    # 同一组服务地址的客户端共享连接池、端点状态和熔断器，复用keep-alive连接，在途请求数全局统计
+    _sessions = {}
+    _endpoint_pools = {}
+    _breakers = {}
+    _sessions_lock = threading.Lock()
+
+    # 正在进行的图片分析请求：(服务地址, 模型, 提示词, 图片哈希) -> Future
+    _in_flight = {}
+    _in_flight_lock = threading.Lock()
+
+    def __init__(self, base_url='http://localhost:11434', model='llava', timeout=60,
+                 pool_size=None, max_retries=None, backoff=None, image_options=None, keep_alive=None):
+        # base_url可以是逗号分隔的多个地址，每次调用路由到在途请求最少的端点
+        self.endpoint_urls = EndpointPool.parse_urls(base_url)
+        self.base_url = ','.join(self.endpoint_urls)
         self.model = model
-        self.api_url = f'{base_url}/api/generate'
-    
+        self.timeout = timeout
+        self.pool_size = pool_size or Config.OLLAMA_POOL_SIZE
+        self.max_retries = Config.OLLAMA_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = Config.OLLAMA_RETRY_BACKOFF if backoff is None else backoff
+        # 发送前缩小、裁剪并重新编码图片，参数见ImageProcessor.encode_for_vlm
+        self.image_options = self.default_image_options() if image_options is None else image_options
+        # 模型在Ollama中保持加载的时长，如'30m'，None时使用服务端默认值
+        self.keep_alive = keep_alive
+        self.session = self._get_session(self.endpoint_urls, self.pool_size)
+        self.endpoints = self._get_endpoint_pool(self.endpoint_urls, self.session)
+        self.breaker = self._get_breaker(self.endpoint_urls)
+
+    @staticmethod
+    def default_image_options():
+        return {
+            'max_side': Config.VLM_IMAGE_MAX_SIDE,
+            'jpeg_quality': Config.VLM_IMAGE_JPEG_QUALITY,
+            'crop_box': Config.VLM_IMAGE_CROP
+        }
+
+    @classmethod
+    def _get_session(cls, endpoint_urls, pool_size):
+        key = tuple(endpoint_urls)
+        with cls._sessions_lock:
+            session = cls._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                # 每个端点一个连接池；重试由_post自行处理，适配器本身不重试
+                adapter = HTTPAdapter(pool_connections=len(endpoint_urls), pool_maxsize=pool_size, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                cls._sessions[key] = session
+            return session
+
+    @classmethod
+    def _get_endpoint_pool(cls, endpoint_urls, session):
+        key = tuple(endpoint_urls)
+        with cls._sessions_lock:
+            pool = cls._endpoint_pools.get(key)
+            if pool is None:
+                pool = EndpointPool(
+                    endpoint_urls,
+                    probe=lambda url: cls._probe(session, url),
+                    max_failures=Config.OLLAMA_MAX_FAILURES,
+                    recheck_interval=Config.OLLAMA_RECHECK_INTERVAL
+                )
+                cls._endpoint_pools[key] = pool
+            return pool
+
+    @classmethod
+    def _get_breaker(cls, endpoint_urls):
+        key = tuple(endpoint_urls)
+        with cls._sessions_lock:
+            breaker = cls._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    failure_threshold=Config.OLLAMA_BREAKER_FAILURES,
+                    reset_timeout=Config.OLLAMA_BREAKER_RESET
+                )
+                cls._breakers[key] = breaker
+            return breaker
+
+    @staticmethod
+    def is_outage(error):
+        """连接失败、超时和5xx说明服务不可用；4xx等说明服务仍在响应"""
+        return error.status_code is None or error.retryable
+
+    @staticmethod
+    def _probe(session, url):
+        response = session.get(f'{url}/api/tags', timeout=5)
+        return response.status_code == 200
+
     def check_connection(self):
+        """任一端点可用即视为已连接"""
+        for url in self.endpoint_urls:
+            try:
+                if self._probe(self.session, url):
+                    return True
+            except Exception:
+                continue
+        return False
+
+    def analyze_image(self, image_path, prompt, timeout=None, stop_when=None, schema=None, num_predict=None):
+        """返回模型的文本回复，失败时抛出OllamaError
+
+        指定stop_when时以流式模式请求，每收到一段输出就用已生成的全部文本调用stop_when，
+        返回True时立即断开连接，模型随之停止生成，返回已生成的文本。
+        schema为JSON Schema时约束模型只输出符合该结构的JSON，num_predict限制生成的token数。
+        """
+        # 熔断打开时不必先解码和重新编码图片
+        if self.breaker.is_open():
+            raise CircuitOpenError('Ollama服务暂不可用（已熔断）')
+        image_data = self._encode_image(image_path)
+        payload = {
+            'model': self.model,
+            'prompt': prompt,
+            'images': [image_data],
+            'stream': stop_when is not None
+        }
+        self._apply_generation_options(payload, schema, num_predict)
+
+        if self.keep_alive is not None:
+            payload['keep_alive'] = self.keep_alive
+
+        key = self.request_key(self.base_url, self.model, prompt, image_data, schema, num_predict, stop_when)
+        result = self._post_coalesced(key, '/api/generate', payload, timeout, stop_when)
+        return result.get('response', '')
+
+    def chat_with_image(self, image_path, conversation_history, timeout=None):
+        """返回模型的对话回复，失败时抛出OllamaError"""
+        if self.breaker.is_open():
+            raise CircuitOpenError('Ollama服务暂不可用（已熔断）')
+        messages = []
+        for msg in conversation_history:
+            messages.append({
+                'role': msg['role'],
+                'content': msg['content']
+            })
+
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'images': [self._encode_image(image_path)],
+            'stream': False
+        }
+
+        result = self._post('/api/chat', payload, timeout)
+        return result.get('message', {}).get('content', '')
+
+    def generate_text(self, prompt, timeout=None, schema=None, num_predict=None):
+        """返回模型生成的文本，失败时抛出OllamaError；schema和num_predict的含义与analyze_image相同"""
+        payload = {
+            'model': self.model,
+            'prompt': prompt,
+            'stream': False
+        }
+        self._apply_generation_options(payload, schema, num_predict)
+
+        result = self._post('/api/generate', payload, timeout)
+        return result.get('response', '')
+
+    def load_model(self, timeout=None):
+        """不带提示词的generate请求只把模型载入内存，用于启动预热"""
+        payload = {'model': self.model}
+        if self.keep_alive is not None:
+            payload['keep_alive'] = self.keep_alive
+        self._post('/api/generate', payload, timeout)
+
+    def get_available_models(self):
+        """返回第一个可用端点上的模型列表"""
+        for url in self.endpoint_urls:
+            try:
+                response = self.session.get(f'{url}/api/tags', timeout=5)
+                if response.status_code == 200:
+                    result = response.json()
+                    return result.get('models', [])
+            except Exception:
+                continue
+        return []
+
+    @staticmethod
+    def _apply_generation_options(payload, schema=None, num_predict=None):
+        if schema is not None:
+            payload['format'] = schema
+        if num_predict is not None:
+            payload.setdefault('options', {})['num_predict'] = num_predict
+
+    @staticmethod
+    def request_key(base_url, model, prompt, image_data, schema=None, num_predict=None, stop_when=None):
+        """图片按发送给模型的编码内容计算哈希，不同路径下的相同图片得到相同的键
+
+        提前结束的条件不同时返回的文本也不同，stop_when按对象本身参与比较，不会共享结果。
+        """
+        image_hash = hashlib.sha256(image_data.encode('ascii')).hexdigest()
+        schema_key = json.dumps(schema, sort_keys=True) if schema is not None else None
+        return (base_url, model, prompt, image_hash, schema_key, num_predict, stop_when)
+
+    def _post_coalesced(self, key, path, payload, timeout=None, stop_when=None):
+        """相同的请求正在进行时不再重复发送，等待并共享同一个结果"""
+        with OllamaClient._in_flight_lock:
+            future = OllamaClient._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                OllamaClient._in_flight[key] = future
+
+        if not leader:
+            try:
+                return future.result(timeout=self.timeout if timeout is None else timeout)
+            except FutureTimeoutError:
+                raise OllamaError('请求超时')
+
         try:
-            response = requests.get(f'{self.base_url}/api/tags', timeout=5)
-            return response.status_code == 200
-        except Exception:
-            return False
-    
-    def analyze_image(self, image_path, prompt):
+            result = self._post(path, payload, timeout, stop_when)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with OllamaClient._in_flight_lock:
+                OllamaClient._in_flight.pop(key, None)
+
+    def _post(self, path, payload, timeout=None, stop_when=None):
+        """经过熔断器发送请求，熔断打开时立即抛出CircuitOpenError而不等待超时"""
+        timeout = self.timeout if timeout is None else timeout
+        if timeout is not None and timeout <= 0:
+            # 调用方的时间预算已经用完，与服务状态无关
+            raise OllamaError('请求超时')
+
+        if not self.breaker.allow_request():
+            raise CircuitOpenError('Ollama服务暂不可用（已熔断）')
+
         try:
-            with open(image_path, 'rb') as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            payload = {
-                'model': self.model,
-                'prompt': prompt,
-                'images': [image_data],
-                'stream': False
-            }
-            
-            response = requests.post(
-                self.api_url,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get('response', '')
+            result = self._post_with_retries(path, payload, timeout, stop_when)
+        except OllamaError as e:
+            if self.is_outage(e):
+                self.breaker.record_failure()
             else:
-                return f'Error: {response.status_code} - {response.text}'
-                
-        except Exception as e:
-            return f'Error: {str(e)}'
-    
-    def chat_with_image(self, image_path, conversation_history):
+                self.breaker.record_success()
+            raise
+
+        self.breaker.record_success()
+        return result
+
+    def _post_with_retries(self, path, payload, timeout=None, stop_when=None):
+        """发送请求并解析JSON响应，5xx和连接中断时按带抖动的指数退避重试
+
+        timeout是所有尝试共享的总时长，重试不会超出调用方的时间预算；
+        每次尝试重新选择端点，失败的请求可以由其他端点重试。
+        """
+        expires_at = time.time() + timeout if timeout else None
+        attempt = 0
+
+        while True:
+            remaining = None if expires_at is None else expires_at - time.time()
+            try:
+                if remaining is not None and remaining <= 0:
+                    raise OllamaError('请求超时')
+                return self._post_to_endpoint(path, payload, remaining, stop_when)
+            except OllamaError as e:
+                if not e.retryable or attempt >= self.max_retries:
+                    raise
+
+                # 全抖动退避，避免多个线程同时重试
+                delay = random.uniform(0, self.backoff * (2 ** attempt))
+                if expires_at is not None and time.time() + delay >= expires_at:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    def _post_to_endpoint(self, path, payload, timeout, stop_when=None):
+        """选择端点发送一次请求，连接失败、超时和5xx计为该端点的失败"""
+        url = self.endpoints.acquire()
+        failed = False
         try:
-            with open(image_path, 'rb') as image_file:
-                image_data = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            messages = []
-            for msg in conversation_history:
-                messages.append({
-                    'role': msg['role'],
-                    'content': msg['content']
-                })
-            
-            payload = {
-                'model': self.model,
-                'messages': messages,
-                'images': [image_data],
-                'stream': False
-            }
-            
-            response = requests.post(
-                f'{self.base_url}/api/chat',
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get('message', {}).get('content', '')
-            else:
-                return f'Error: {response.status_code} - {response.text}'
-                
-        except Exception as e:
-            return f'Error: {str(e)}'
-    
-    def generate_text(self, prompt):
+            return self._post_once(f'{url}{path}', payload, timeout, stop_when)
+        except OllamaError as e:
+            failed = self.is_outage(e)
+            raise
+        finally:
+            self.endpoints.release(url, failed)
+
+    def _post_once(self, url, payload, timeout, stop_when=None):
+        stream = payload.get('stream', False)
         try:
-            payload = {
-                'model': self.model,
-                'prompt': prompt,
-                'stream': False
-            }
-            
-            response = requests.post(
-                self.api_url,
-                json=payload,
-                timeout=60
+            response = self.session.post(url, json=payload, timeout=timeout, stream=stream)
+        except requests.exceptions.Timeout as e:
+            raise OllamaError(f'请求超时: {e}') from e
+        except requests.exceptions.ConnectionError as e:
+            raise OllamaError(f'连接失败: {e}', retryable=True) from e
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f'请求失败: {e}') from e
+
+        if response.status_code != 200:
+            raise OllamaError(
+                f'{response.status_code} - {response.text}',
+                status_code=response.status_code,
+                retryable=response.status_code in self.RETRYABLE_STATUS
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get('response', '')
-            else:
-                return f'Error: {response.status_code} - {response.text}'
-                
-        except Exception as e:
-            return f'Error: {str(e)}'
-    
-    def get_available_models(self):
+
+        if stream:
+            with response:
+                return self._read_stream(response, timeout, stop_when)
+
         try:
-            response = requests.get(f'{self.base_url}/api/tags', timeout=5)
-            if response.status_code == 200:
-                result = response.json()
-                return result.get('models', [])
-            return []
-        except Exception:
-            return []
+            return response.json()
+        except ValueError as e:
+            raise OllamaError(f'响应不是有效的JSON: {e}') from e
+
+    def _read_stream(self, response, timeout, stop_when):
+        """逐行读取流式响应并拼接输出，返回与非流式响应相同结构的结果"""
+        # requests的超时只限制单次读取，总时长在这里检查
+        expires_at = time.time() + timeout if timeout else None
+        parts = []
+
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('error'):
+                    raise OllamaError(chunk['error'])
+
+                parts.append(chunk.get('response', ''))
+                if chunk.get('done'):
+                    break
+
+                text = ''.join(parts)
+                if stop_when is not None and stop_when(text):
+                    # 提前关闭连接，Ollama检测到客户端断开后停止生成
+                    return {'response': text, 'done': False}
+                if expires_at is not None and time.time() >= expires_at:
+                    raise OllamaError('请求超时')
+        except requests.exceptions.RequestException as e:
+            raise OllamaError(f'读取流式响应失败: {e}', retryable=True) from e
+        except ValueError as e:
+            raise OllamaError(f'流式响应不是有效的JSON: {e}') from e
+
+        return {'response': ''.join(parts), 'done': True}
+
+    def _encode_image(self, image_path):
+        return ImageProcessor.encode_for_vlm(image_path, **self.image_options)
@@ -0,0 +1,72 @@
+import json
+import os
+import re
+import time
+import uuid
+
+class RenamePlanStore:
+    """保存预览生成的重命名计划，确认后按同一计划执行，无需重新提取"""
+
+    def __init__(self, plan_folder, ttl_seconds=24 * 3600):
+        self.plan_folder = plan_folder
+        self.ttl_seconds = ttl_seconds
+
+    def save(self, plan):
+        os.makedirs(self.plan_folder, exist_ok=True)
+        # 预览后从未确认的计划不会被load读到，保存新计划时顺带清理
+        self.purge_expired()
+        plan_id = uuid.uuid4().hex
+        plan = dict(plan, plan_id=plan_id, created_at=time.time())
+
+        # 先写临时文件再替换，避免留下写了一半的计划
+        path = self._path(plan_id)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(plan, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        return plan_id
+
+    def load(self, plan_id):
+        """读取计划，不存在或已过期时返回None"""
+        if not re.fullmatch(r'[0-9a-f]{32}', plan_id or ''):
+            return None
+
+        path = self._path(plan_id)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+
+        if time.time() - plan.get('created_at', 0) > self.ttl_seconds:
+            self.delete(plan_id)
+            return None
+
+        return plan
+
+    def delete(self, plan_id):
+        try:
+            os.remove(self._path(plan_id))
+        except OSError:
+            pass
+
+    def purge_expired(self):
+        """删除超过有效期的计划文件及写入中断留下的临时文件，以修改时间判断，不必逐个解析"""
+        cutoff = time.time() - self.ttl_seconds
+        try:
+            entries = list(os.scandir(self.plan_folder))
+        except OSError:
+            return
+
+        for entry in entries:
+            if not entry.name.endswith(('.json', '.json.tmp')):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                # 可能已被并发的load或另一次清理删除
+                pass
+
+    def _path(self, plan_id):
+        return os.path.join(self.plan_folder, f'{plan_id}.json')
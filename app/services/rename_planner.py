@@ -0,0 +1,198 @@
+import os
+import re
+import uuid
+from collections import deque
+
+class RenamePlanner:
+    """批量重命名规划器
+
+    每个目录只列举一次，之后在内存中维护目录内的文件名集合，
+    一批重命名的冲突在内存中统一解决，再按依赖顺序提交。
+    互换或循环重命名（A->B, B->A）通过临时文件名打破循环。
+    """
+
+    def __init__(self):
+        self._directories = {}
+
+    def plan(self, items):
+        """为一批重命名分配唯一的目标路径
+
+        items为[(源路径, 基础文件名, 扩展名)]，返回{源路径: 目标路径}。
+        """
+        plan = {}
+        leaving = {}
+
+        # 当前文件名已经是"基础名"或"基础名_序号"的保持不变，重复处理时不会来回改名
+        for src, base_filename, ext in items:
+            directory, filename = os.path.split(src)
+            if self._matches_base(filename, base_filename, ext):
+                plan[src] = src
+            else:
+                leaving.setdefault(directory, set()).add(filename)
+
+        # 其余文件离开原名，原名可以分配给同一批中的其他文件
+        assigned = {}
+        for src, base_filename, ext in items:
+            if src in plan:
+                continue
+
+            directory = os.path.dirname(src)
+            names = self._names(directory)
+            taken = assigned.setdefault(directory, set())
+            free_names = leaving.get(directory, set())
+
+            counter = 1
+            candidate = f"{base_filename}{ext}"
+            while candidate in taken or (candidate in names and candidate not in free_names):
+                candidate = f"{base_filename}_{counter}{ext}"
+                counter += 1
+
+            taken.add(candidate)
+            plan[src] = os.path.join(directory, candidate)
+
+        return plan
+
+    def find_conflicts(self, plan):
+        """检查目标文件名是否已被计划外或不再移动的文件占用，返回{源路径: 错误信息}"""
+        conflicts = {}
+        targets = set()
+
+        for src, dst in plan.items():
+            if src == dst:
+                continue
+            if dst in targets:
+                conflicts[src] = '与同一计划中的其他文件目标重名'
+            targets.add(dst)
+
+        # 一个文件不能移动时仍占着原名，以它为目标的重命名也要跟着取消，直到没有新的冲突
+        changed = True
+        while changed:
+            changed = False
+            for src, dst in plan.items():
+                if src == dst or src in conflicts:
+                    continue
+
+                occupied = os.path.basename(dst) in self._names(os.path.dirname(dst))
+                # 占用者是同一计划中会被移走的文件时，提交阶段会按依赖顺序处理
+                moving_away = dst in plan and plan[dst] != dst and dst not in conflicts
+                if occupied and not moving_away:
+                    conflicts[src] = '目标文件名已被其他文件占用'
+                    changed = True
+
+        return conflicts
+
+    def commit(self, plan, overwrite=True):
+        """按依赖顺序执行重命名，返回{源路径: 错误信息或None}
+
+        目录列举之后才出现在目标路径上的计划外文件不会被覆盖（与overwrite无关），该条目失败；
+        计划内占着目标名的文件按依赖顺序先移走，overwrite只决定失败时的提示。
+        """
+        outcomes = {}
+        moves = {}
+        for src, dst in plan.items():
+            if src == dst:
+                outcomes[src] = None
+            else:
+                moves[src] = dst
+
+        # 目标路径正被另一个待移动文件占用时，需要等该文件先移走
+        waiting = {}
+        ready = deque()
+        for src, dst in moves.items():
+            if dst in moves:
+                waiting[dst] = src
+            else:
+                ready.append(src)
+
+        # 临时文件名 -> 原始源路径
+        originals = {}
+
+        while moves:
+            if not ready:
+                # 剩下的都在循环中，先把一个被等待的文件移到临时文件名
+                src = next(path for path in moves if path in waiting)
+                dst = moves.pop(src)
+                temp_path = self._temp_path(src)
+                error = self._rename(src, temp_path, True)
+                if error:
+                    self._fail(src, error, moves, waiting, outcomes, originals)
+                    continue
+
+                moves[temp_path] = dst
+                originals[temp_path] = originals.pop(src, src)
+                if dst in moves:
+                    waiting[dst] = temp_path
+                else:
+                    ready.append(temp_path)
+                ready.append(waiting.pop(src))
+                continue
+
+            src = ready.popleft()
+            dst = moves.pop(src)
+            error = self._rename(src, dst, overwrite)
+            if error:
+                if src in originals:
+                    error = f'{error}（文件暂存为: {os.path.basename(src)}）'
+                self._fail(src, error, moves, waiting, outcomes, originals)
+                continue
+
+            outcomes[originals.pop(src, src)] = None
+            if src in waiting:
+                ready.append(waiting.pop(src))
+
+        return outcomes
+
+    def _fail(self, src, error, moves, waiting, outcomes, originals):
+        """重命名失败时源文件仍占着原名，等待该名字的重命名也随之失败"""
+        outcomes[originals.pop(src, src)] = error
+        while src in waiting:
+            blocked = waiting.pop(src)
+            moves.pop(blocked, None)
+            outcomes[originals.pop(blocked, blocked)] = '目标文件名被占用，重命名失败'
+            src = blocked
+
+    def _rename(self, src, dst, overwrite):
+        directory = os.path.dirname(dst)
+        names = self._names(directory)
+
+        # 按依赖顺序提交时，计划内占着目标名的文件此时已经移走，目标仍存在说明是列举之后出现的计划外文件
+        if os.path.lexists(dst):
+            names.add(os.path.basename(dst))
+            if not overwrite:
+                return '新文件名已存在，且未选择覆盖选项'
+            return '新文件名已被计划外的文件占用，未覆盖'
+
+        try:
+            os.rename(src, dst)
+        except Exception as e:
+            return str(e)
+
+        # 同步更新内存中的目录视图
+        self._names(os.path.dirname(src)).discard(os.path.basename(src))
+        names.add(os.path.basename(dst))
+        return None
+
+    def _names(self, directory):
+        """返回目录中的文件名集合，每个目录只列举一次"""
+        names = self._directories.get(directory)
+        if names is None:
+            try:
+                with os.scandir(directory) as entries:
+                    names = {entry.name for entry in entries}
+            except OSError:
+                names = set()
+            self._directories[directory] = names
+        return names
+
+    def _temp_path(self, src):
+        directory = os.path.dirname(src)
+        names = self._names(directory)
+        while True:
+            temp_name = f".renaming-{uuid.uuid4().hex[:12]}{os.path.splitext(src)[1]}"
+            if temp_name not in names and not os.path.lexists(os.path.join(directory, temp_name)):
+                return os.path.join(directory, temp_name)
+
+    @staticmethod
+    def _matches_base(filename, base_filename, ext):
+        pattern = re.escape(base_filename) + r'(_\d+)?' + re.escape(ext)
+        return re.fullmatch(pattern, filename) is not None
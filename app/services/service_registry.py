@@ -0,0 +1,73 @@
+import threading
+import time
+from app.services.ollama_client import OllamaClient
+from app.services.text_extractor import TextExtractor
+from app.services.batch_processor import BatchProcessor
+from app.services.batch_pipeline import shutdown_ocr_pool
+from app.services.extraction_cache import get_default_cache
+from app.services.ocr_cascade import get_default_ocr_stats
+from app.services.layout_cache import get_default_layout_cache
+
+class ServiceRegistry:
+    """应用级共享服务，在create_app中创建一次
+
+    Ollama客户端（及其连接池）、文本提取器、提取缓存、OCR统计和版面缓存在所有请求、
+    后台任务和文件夹监视器之间共享；Ollama健康检查结果按TTL缓存，请求处理中不再同步探测。
+    OCR进程池在首次使用时创建，随shutdown()一起关闭。
+    """
+
+    def __init__(self, base_url, model, health_ttl=30.0, keep_alive=None):
+        self.ollama_client = OllamaClient(base_url=base_url, model=model, keep_alive=keep_alive)
+        # 与OCR工作进程中按配置创建的实例使用同一组数据库文件
+        self.cache = get_default_cache()
+        self.ocr_stats = get_default_ocr_stats()
+        self.layout_cache = get_default_layout_cache()
+        self.text_extractor = TextExtractor(self.ollama_client, check_connection=False, cache=self.cache,
+                                            ocr_stats=self.ocr_stats, layout_cache=self.layout_cache)
+        self.health_ttl = health_ttl
+        self._health = None
+        self._lock = threading.Lock()
+
+    def create_batch_processor(self):
+        """创建使用共享提取器的BatchProcessor，可直接作为processor_factory"""
+        return BatchProcessor(text_extractor=self.text_extractor)
+
+    def ollama_status(self, force=False):
+        """返回Ollama连接状态，结果在health_ttl秒内复用"""
+        with self._lock:
+            health = self._health
+            if force or health is None or time.time() - health['checked_at'] >= self.health_ttl:
+                connected = self.ollama_client.check_connection()
+                models = self.ollama_client.get_available_models() if connected else []
+                health = {
+                    'connected': connected,
+                    'available_models': [model.get('name') for model in models],
+                    'checked_at': time.time()
+                }
+                self._health = health
+        # 端点负载、摘除和熔断状态实时变化，不缓存
+        return dict(health, endpoints=self.ollama_client.endpoints.stats(),
+                    circuit=self.ollama_client.breaker.snapshot())
+
+    def is_ollama_available(self):
+        return self.ollama_status()['connected']
+
+    def warmup(self):
+        """在后台线程中预加载模型，首个请求不必等待模型载入显存"""
+        def run():
+            if self.is_ollama_available():
+                try:
+                    self.ollama_client.load_model()
+                    print(f'Ollama 模型已预加载: {self.ollama_client.model}')
+                except Exception as e:
+                    print(f'警告: Ollama 模型预加载失败: {e}')
+            else:
+                print('警告: Ollama 大模型未连接，请确保Ollama服务正在运行')
+
+        thread = threading.Thread(target=run, name='ollama-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        """关闭OCR进程池，用于应用退出或基准测试的场景之间"""
+        shutdown_ocr_pool(wait=False)
@@ -0,0 +1,40 @@
+import os
+import sqlite3
+import threading
+
+class SqliteStore:
+    """SQLite持久化存储的基类：WAL模式的共享连接、线程锁和容错写入
+
+    子类在SCHEMA中给出建表语句。连接在线程间共享，由self._lock串行化；
+    WAL模式下多个OCR工作进程可以同时读写同一个数据库文件。
+    """
+
+    SCHEMA = ''
+
+    def __init__(self, db_path, timeout=5, synchronous=None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        if synchronous:
+            self._conn.execute(f'PRAGMA synchronous={synchronous}')
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql, params=()):
+        """执行一条写入并提交，调用方需持有self._lock
+
+        统计和版面只用于加速，写入失败（如数据库被其他进程锁定）时忽略，返回是否成功。
+        """
+        try:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+            return True
+        except sqlite3.Error:
+            return False
@@ -1,115 +1,392 @@
 import cv2
-import pytesseract
 import re
+import json
 from datetime import datetime
 import os
 from app.services.ollama_client import OllamaClient
+from app.services.extraction_cache import ExtractionCache
+from app.services.ocr_cascade import PREPROCESSING_VARIANTS, run_ocr_variant, get_default_ocr_stats
+from app.services.text_region import detect_text_regions, crop_regions
+from app.services.layout_cache import LayoutCache, get_default_layout_cache
+from app.services.deadline import Deadline, DeadlineExceeded, BatchCancelled
+from config import Config
+
+# 进程池中的OCR工作进程各自持有一个提取器实例
+_ocr_worker_extractor = None
+
+def run_ocr_stage(image_path, deadline=None):
+    """进程池入口：在子进程中执行Tesseract OCR阶段"""
+    global _ocr_worker_extractor
+    if _ocr_worker_extractor is None:
+        _ocr_worker_extractor = TextExtractor(check_connection=False)
+    return _ocr_worker_extractor.extract_with_ocr(image_path, deadline)
 
 class TextExtractor:
-    def __init__(self):
+    # 修改提示词或解析逻辑时递增，使旧的缓存结果失效
+    PROMPT_VERSION = 2
+    EXTRACT_PROMPT = "请从这张图片中提取出姓名和日期。输出格式为：\n姓名：[姓名]\n日期：[日期]\n\n只需要提取的信息，不要其他多余的文字。"
+    # 结构化输出模式使用的提示词和JSON Schema，模型只能输出符合该结构的JSON
+    EXTRACT_JSON_PROMPT = "请从这张图片中提取出姓名和日期，以JSON格式输出，字段为name和date，日期格式为YYYY-MM-DD。识别不出的字段输出空字符串。"
+    EXTRACT_SCHEMA = {
+        'type': 'object',
+        'properties': {
+            'name': {'type': 'string'},
+            'date': {'type': 'string'}
+        },
+        'required': ['name', 'date']
+    }
+    
+    def __init__(self, ollama_client=None, check_connection=True, cache=None, stream=None, structured=None,
+                 ocr_stats=None, layout_cache=None):
         # 初始化Ollama客户端
-        self.ollama_client = OllamaClient(model='qwen3-vl:4b')
+        self.ollama_client = ollama_client or OllamaClient(model='qwen3-vl:4b')
+        # 流式接收大模型输出，姓名和日期都已输出后提前结束生成
+        self.stream = Config.OLLAMA_STREAM if stream is None else stream
+        # 要求大模型按EXTRACT_SCHEMA输出JSON，不再依赖正则解析自由文本
+        self.structured = Config.OLLAMA_STRUCTURED_OUTPUT if structured is None else structured
+        # 提取结果缓存，为None时不使用缓存
+        self.cache = cache
+        # OCR各预处理方式的历史成功率，决定尝试顺序
+        self.ocr_stats = ocr_stats if ocr_stats is not None else get_default_ocr_stats()
+        # 按相机学习的文字区域位置，先识别该区域，未命中时再做完整检测
+        self.layout_cache = layout_cache if layout_cache is not None else get_default_layout_cache()
         # 检查Ollama连接
-        if self.ollama_client.check_connection():
-            print('Ollama 大模型连接成功')
-        else:
-            print('警告: Ollama 大模型未连接，请确保Ollama服务正在运行')
+        if check_connection:
+            if self.ollama_client.check_connection():
+                print('Ollama 大模型连接成功')
+            else:
+                print('警告: Ollama 大模型未连接，请确保Ollama服务正在运行')
     
-    def extract_info(self, image_path):
-        """从图片中提取姓名和日期"""
+    def extract_info(self, image_path, deadline=None):
+        """从图片中提取姓名和日期，deadline为所有提取阶段共享的时间预算"""
+        deadline = deadline or Deadline()
+        
         try:
-            # 检查文件是否存在
-            if not os.path.exists(image_path):
-                raise Exception(f"文件不存在: {image_path}")
+            deadline.check()
+            self.check_image_file(image_path)
             
-            # 检查文件大小
-            if os.path.getsize(image_path) == 0:
-                raise Exception("文件为空")
+            # 0. 相同内容的图片已经提取过，直接使用缓存结果
+            cache_key, cached = self.lookup_cache(image_path)
+            if cached:
+                return self.complete_with_file_info(image_path, cached['name'], cached['date'], '[Cache]: 命中提取结果缓存')
             
             # 1. 首先尝试使用Ollama大模型提取信息
-            name = None
-            date = None
-            extracted_text = ""
-            
-            # 构建提取姓名和日期的prompt
-            prompt = "请从这张图片中提取出姓名和日期。输出格式为：\n姓名：[姓名]\n日期：[日期]\n\n只需要提取的信息，不要其他多余的文字。"
-            
-            # 使用Ollama分析图片
-            try:
-                ollama_response = self.ollama_client.analyze_image(image_path, prompt)
-                extracted_text = f"[Ollama]: {ollama_response}"
-                
-                # 解析Ollama的响应
-                if ollama_response and not ollama_response.startswith('Error'):
-                    name, date = self._parse_ollama_response(ollama_response)
-            except Exception as e:
-                extracted_text += f"[Ollama Error]: {str(e)}"
-                # 继续执行，尝试其他方法
+            name, date, extracted_text = self.extract_with_ollama(image_path, deadline)
             
             # 2. 如果Ollama失败，尝试使用Tesseract OCR
             if not name or not date:
-                try:
-                    # 读取图片
-                    image = cv2.imread(image_path)
-                    if image is not None:
-                        # 预处理图片以提高OCR accuracy
-                        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                        
-                        # 尝试多种预处理方法
-                        preprocessing_methods = [
-                            ('thresh', cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]),
-                            ('blur', cv2.GaussianBlur(gray, (5, 5), 0)),
-                            ('adaptive', cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)),
-                            ('median', cv2.medianBlur(gray, 3))
-                        ]
-                        
-                        for method_name, processed_image in preprocessing_methods:
-                            try:
-                                text = pytesseract.image_to_string(processed_image, lang='chi_sim+eng')
-                                if text:
-                                    extracted_text += f"[{method_name}]: {text}\n"
-                                    # 尝试从OCR文本中提取信息
-                                    if not name or not date:
-                                        temp_name = self._extract_name(text)
-                                        temp_date = self._extract_date(text)
-                                        if temp_name:
-                                            name = temp_name
-                                        if temp_date:
-                                            date = temp_date
-                            except Exception as e:
-                                pass
-                except Exception as e:
-                    pass
+                deadline.check()
+                ocr_name, ocr_date, ocr_text = self.extract_with_ocr(image_path, deadline)
+                extracted_text += ocr_text
+                name = name or ocr_name
+                date = date or ocr_date
+            
+            self.store_cache(cache_key, name, date)
             
             # 3. 如果所有方法都失败，尝试从文件名和文件元数据中提取信息
-            if not name or not date:
-                name_from_file, date_from_file = self._extract_from_file_info(image_path)
-                if not name:
-                    name = name_from_file
-                if not date:
-                    date = date_from_file
+            return self.complete_with_file_info(image_path, name, date, extracted_text)
             
-            return {
-                'name': name,
-                'date': date,
-                'extracted_text': extracted_text
-            }
+        except (DeadlineExceeded, BatchCancelled) as e:
+            return self.interrupted_result(e)
+        except Exception as e:
+            return self.fallback_result(image_path, e)
+    
+    def check_image_file(self, image_path):
+        """检查图片文件是否存在且非空"""
+        # 检查文件是否存在
+        if not os.path.exists(image_path):
+            raise Exception(f"文件不存在: {image_path}")
+        
+        # 检查文件大小
+        if os.path.getsize(image_path) == 0:
+            raise Exception("文件为空")
+    
+    def lookup_cache(self, image_path):
+        """按图片内容查询缓存，返回(缓存键, 缓存结果)"""
+        if self.cache is None:
+            return None, None
+        
+        content_hash = ExtractionCache.hash_file(image_path)
+        # 结构化与自由文本两种提示词、发送给模型的图片尺寸、质量和裁剪方式不同时，结果可能不同
+        settings = {
+            'structured': self.structured,
+            'image': getattr(self.ollama_client, 'image_options', None)
+        }
+        cache_key = ExtractionCache.make_key(content_hash, self.ollama_client.model, self.PROMPT_VERSION, settings)
+        return cache_key, self.cache.get(cache_key)
+    
+    def store_cache(self, cache_key, name, date):
+        """只缓存从图片内容中提取到的完整结果，文件名推断的结果与内容无关"""
+        if self.cache is None or cache_key is None or not name or not date:
+            return
+        
+        self.cache.put(cache_key, {'name': name, 'date': date})
+    
+    def extract_with_ollama(self, image_path, deadline=None):
+        """使用Ollama大模型提取姓名和日期，返回(姓名, 日期, 原始文本)"""
+        deadline = deadline or Deadline()
+        name = None
+        date = None
+        extracted_text = ""
+        
+        # 使用Ollama分析图片，请求超时不超过剩余的时间预算
+        try:
+            timeout = deadline.timeout(self.ollama_client.timeout)
+            prompt, request_options = self._ollama_request()
+            ollama_response = self.ollama_client.analyze_image(image_path, prompt, timeout=timeout, **request_options)
+            extracted_text = f"[Ollama]: {ollama_response}"
+            
+            # 解析Ollama的响应
+            if ollama_response:
+                name, date = self._parse_response(ollama_response)
+        except Exception as e:
+            # 调用失败（OllamaError）或解析出错，继续执行，尝试其他方法
+            extracted_text += f"[Ollama Error]: {str(e)}"
+        
+        return name, date, extracted_text
+    
+    async def extract_with_ollama_async(self, async_client, image_path, deadline=None):
+        """extract_with_ollama的异步版本，使用AsyncOllamaClient发送请求"""
+        deadline = deadline or Deadline()
+        name = None
+        date = None
+        extracted_text = ""
+        
+        try:
+            timeout = deadline.timeout(async_client.timeout)
+            prompt, request_options = self._ollama_request()
+            ollama_response = await async_client.analyze_image(image_path, prompt, timeout=timeout, **request_options)
+            extracted_text = f"[Ollama]: {ollama_response}"
             
+            if ollama_response:
+                name, date = self._parse_response(ollama_response)
+        except Exception as e:
+            extracted_text += f"[Ollama Error]: {str(e)}"
+        
+        return name, date, extracted_text
+    
+    def extract_with_ocr(self, image_path, deadline=None):
+        """使用Tesseract OCR提取姓名和日期，返回(姓名, 日期, 原始文本)
+        
+        依次识别同一相机已学习的文字区域、检测到的文字区域和整张图片，
+        姓名和日期都识别出后不再进行后面的步骤；只识别出一项时继续识别下一步，补全缺少的字段。
+        """
+        deadline = deadline or Deadline()
+        best = {'name': (None, -1), 'date': (None, -1)}
+        extracted_text = ""
+        
+        try:
+            # 读取图片
+            image = cv2.imread(image_path)
+            if image is not None:
+                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                
+                signature = None
+                if self.layout_cache is not None and Config.OCR_TEXT_REGIONS:
+                    signature = LayoutCache.signature(image_path, gray)
+                
+                for label, boxes in self._ocr_targets(gray, signature):
+                    target = crop_regions(gray, boxes) if boxes else gray
+                    if target is None:
+                        continue
+                    target_best = {'name': (None, -1), 'date': (None, -1)}
+                    extracted_text += self._ocr_cascade(target, deadline, target_best, label)
+                    for field, (value, confidence) in target_best.items():
+                        if value and confidence > best[field][1]:
+                            best[field] = (value, confidence)
+                    
+                    # 版面只有在该区域本身识别出姓名和日期两项时才算命中或被学习
+                    if signature is not None:
+                        complete = bool(target_best['name'][0] and target_best['date'][0])
+                        if label == '@layout':
+                            self.layout_cache.record(signature, complete)
+                        elif label == '@regions' and complete:
+                            self.layout_cache.learn(signature, boxes)
+                    
+                    if best['name'][0] and best['date'][0]:
+                        break
+        except (DeadlineExceeded, BatchCancelled):
+            raise
         except Exception as e:
-            # 即使出现异常，也尝试从文件信息中提取
+            pass
+        
+        return best['name'][0], best['date'][0], extracted_text
+    
+    def _ocr_targets(self, gray, signature):
+        """依次产出(标签, 文字区域)，整张图片的区域为None；文字区域检测只在需要时进行"""
+        if signature is not None:
+            layout = self.layout_cache.get(signature)
+            if layout:
+                yield '@layout', layout
+        
+        if Config.OCR_TEXT_REGIONS:
+            regions = detect_text_regions(gray)
+            if regions:
+                yield '@regions', regions
+        
+        yield '', None
+    
+    def _ocr_cascade(self, gray, deadline, best, label=''):
+        """按历史成功率尝试各预处理方式，返回识别出的原始文本
+        
+        best中保存各字段置信度最高的识别结果；两项都达到OCR_MIN_CONFIDENCE后不再等待其余方式。
+        """
+        extracted_text = ""
+        variants = list(PREPROCESSING_VARIANTS)
+        if self.ocr_stats is not None:
+            variants = self.ocr_stats.rank(variants)
+        
+        results = self._iter_variants(gray, variants, deadline)
+        
+        try:
+            for method_name, lines in results:
+                text = '\n'.join(line for line, _ in lines)
+                name, name_conf, date, date_conf = self._read_fields(lines)
+                if self.ocr_stats is not None:
+                    self.ocr_stats.record(method_name, name, date)
+                if text:
+                    extracted_text += f"[{method_name}{label}]: {text}\n"
+                
+                if name and name_conf > best['name'][1]:
+                    best['name'] = (name, name_conf)
+                if date and date_conf > best['date'][1]:
+                    best['date'] = (date, date_conf)
+                
+                if min(best['name'][1], best['date'][1]) >= Config.OCR_MIN_CONFIDENCE:
+                    break
+        finally:
+            results.close()
+        
+        return extracted_text
+    
+    def _iter_variants(self, gray, variants, deadline):
+        """依次识别，产出(预处理方式, 识别行)；预处理图片在轮到时才生成"""
+        for method_name in variants:
+            # 每次OCR前检查时间预算，单次OCR也不超过剩余时间
+            deadline.check()
             try:
-                name_from_file, date_from_file = self._extract_from_file_info(image_path)
-                return {
-                    'name': name_from_file,
-                    'date': date_from_file,
-                    'error': str(e)
-                }
-            except:
-                return {
-                    'name': None,
-                    'date': None,
-                    'error': str(e)
-                }
+                lines = run_ocr_variant(method_name, gray, deadline.remaining() or 0)
+            except Exception as e:
+                # Tesseract因超时被终止时，下一轮检查会抛出DeadlineExceeded
+                continue
+            yield method_name, lines
+    
+    def _read_fields(self, lines):
+        """从OCR行中提取姓名和日期，返回(姓名, 置信度, 日期, 置信度)
+        
+        字段的置信度取包含该字段的行的平均置信度，找不到对应行时取全文平均值。
+        """
+        text = '\n'.join(line for line, _ in lines)
+        overall = sum(conf for _, conf in lines) / len(lines) if lines else 0
+        
+        name = self._extract_name(text)
+        date = self._extract_date(text)
+        
+        name_conf = overall
+        if name:
+            compact_name = re.sub(r'\s', '', name)
+            matched = [conf for line, conf in lines if compact_name in re.sub(r'\s', '', line)]
+            name_conf = max(matched) if matched else overall
+        
+        date_conf = overall
+        if date:
+            matched = [conf for line, conf in lines if self._extract_date(line) == date]
+            date_conf = max(matched) if matched else overall
+        
+        return name, name_conf, date, date_conf
+    
+    def complete_with_file_info(self, image_path, name, date, extracted_text):
+        """用文件名和文件元数据补全缺失的姓名或日期，返回最终结果"""
+        if not name or not date:
+            name_from_file, date_from_file = self._extract_from_file_info(image_path)
+            if not name:
+                name = name_from_file
+            if not date:
+                date = date_from_file
+        
+        return {
+            'name': name,
+            'date': date,
+            'extracted_text': extracted_text
+        }
+    
+    @staticmethod
+    def interrupted_result(error):
+        """超时或取消时不再用文件信息推断，交由调用方标记并在下次处理时重试"""
+        return {
+            'name': None,
+            'date': None,
+            'status': 'skipped' if isinstance(error, BatchCancelled) else 'timeout',
+            'error': str(error)
+        }
+    
+    def fallback_result(self, image_path, error):
+        """出现异常时，尝试仅从文件信息中提取"""
+        try:
+            name_from_file, date_from_file = self._extract_from_file_info(image_path)
+            return {
+                'name': name_from_file,
+                'date': date_from_file,
+                'error': str(error)
+            }
+        except:
+            return {
+                'name': None,
+                'date': None,
+                'error': str(error)
+            }
+    
+    def _ollama_request(self):
+        """返回(提示词, analyze_image的其余参数)"""
+        request_options = {'num_predict': Config.OLLAMA_EXTRACT_NUM_PREDICT, 'stop_when': self._stop_condition()}
+        if self.structured:
+            return self.EXTRACT_JSON_PROMPT, dict(request_options, schema=self.EXTRACT_SCHEMA)
+        return self.EXTRACT_PROMPT, request_options
+    
+    def _stop_condition(self):
+        if not self.stream:
+            return None
+        # 结构化输出时JSON对象完整后即可结束，不必等模型继续输出空白直到num_predict
+        return self._has_complete_json if self.structured else self._has_required_fields
+    
+    @staticmethod
+    def _has_complete_json(response):
+        """已输出的内容是包含姓名和日期的完整JSON对象"""
+        if not response.rstrip().endswith('}'):
+            return False
+        try:
+            data = json.loads(response)
+        except ValueError:
+            return False
+        return isinstance(data, dict) and 'name' in data and 'date' in data
+    
+    @staticmethod
+    def _has_required_fields(response):
+        """姓名和日期两行都已完整输出（以换行结束）时，后续输出不再需要"""
+        return (re.search(r'姓名[：:][^\n]*\S[^\n]*\n', response) is not None and
+                re.search(r'日期[：:][^\n]*\d[^\n]*\n', response) is not None)
+    
+    def _parse_response(self, response):
+        """结构化输出无法解析时（模型不支持format等），退回自由文本解析"""
+        if self.structured:
+            parsed = self._parse_json_response(response)
+            if parsed is not None:
+                return parsed
+        return self._parse_ollama_response(response)
+    
+    def _parse_json_response(self, response):
+        """解析按EXTRACT_SCHEMA输出的JSON，返回(姓名, 日期)，不是合法JSON时返回None"""
+        try:
+            data = json.loads(response)
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        
+        name = re.sub(r'[^\u4e00-\u9fa5A-Za-z\s]', '', str(data.get('name') or '')).strip()
+        date_str = str(data.get('date') or '').strip()
+        date = self._normalize_date(date_str) if date_str else None
+        return name or None, date
     
     def _parse_ollama_response(self, response):
         """解析Ollama大模型的响应，提取姓名和日期"""
@@ -162,8 +439,8 @@ class TextExtractor:
             date_patterns = [
                 r'(\d{4})(\d{2})(\d{2})',  # YYYYMMDD
                 r'(\d{8})',  # 8位数字日期
-                r'(\d{4})[/-\.](\d{2})[/-\.](\d{2})',  # YYYY-MM-DD
-                r'(\d{2})[/-\.](\d{2})[/-\.](\d{4})',  # MM-DD-YYYY
+                r'(\d{4})[/.-](\d{2})[/.-](\d{2})',  # YYYY-MM-DD
+                r'(\d{2})[/.-](\d{2})[/.-](\d{4})',  # MM-DD-YYYY
             ]
             
             for pattern in date_patterns:
@@ -271,13 +548,13 @@ class TextExtractor:
         """从文本中提取日期"""
         # 增强的日期提取规则
         date_patterns = [
-            r'(\d{4})[/-\.](\d{2})[/-\.](\d{2})',  # YYYY-MM-DD, YYYY/MM/DD, YYYY.MM.DD
-            r'(\d{2})[/-\.](\d{2})[/-\.](\d{4})',  # MM-DD-YYYY, MM/DD/YYYY, MM.DD.YYYY
+            r'(\d{4})[/.-](\d{2})[/.-](\d{2})',  # YYYY-MM-DD, YYYY/MM/DD, YYYY.MM.DD
+            r'(\d{2})[/.-](\d{2})[/.-](\d{4})',  # MM-DD-YYYY, MM/DD/YYYY, MM.DD.YYYY
             r'(\d{4})(\d{2})(\d{2})',  # YYYYMMDD
             r'(\d{8})',  # 8位数字日期
-            r'(\d{2})[/-\.](\d{2})[/-\.](\d{2})',  # MM-DD-YY, MM/DD/YY
-            r'日期[:：]\s*(\d{4}[/-\.]\d{2}[/-\.]\d{2})',  # 日期: YYYY-MM-DD
-            r'Date[:：]\s*(\d{2}[/-\.]\d{2}[/-\.]\d{4})',  # Date: MM/DD/YYYY
+            r'(\d{2})[/.-](\d{2})[/.-](\d{2})',  # MM-DD-YY, MM/DD/YY
+            r'日期[:：]\s*(\d{4}[/.-]\d{2}[/.-]\d{2})',  # 日期: YYYY-MM-DD
+            r'Date[:：]\s*(\d{2}[/.-]\d{2}[/.-]\d{4})',  # Date: MM/DD/YYYY
         ]
         
         for pattern in date_patterns:
@@ -328,6 +605,16 @@ class TextExtractor:
         
         return None
     
+    def _normalize_date(self, date_str):
+        """把大模型输出的日期标准化为YYYYMMDD，无法识别时返回None"""
+        match = re.search(r'(\d{4})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})', date_str)
+        if match:
+            year, month, day = match.group(1), match.group(2).zfill(2), match.group(3).zfill(2)
+            if self._is_valid_date(year, month, day):
+                return f"{year}{month}{day}"
+        
+        return self._extract_date(date_str)
+    
     def _is_valid_date(self, year, month, day):
         """验证日期是否有效"""
         try:
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+
+def detect_text_regions(gray, max_side=800, max_regions=4, padding=0.01):
+    """在缩小的灰度图上定位印有文字的区域，返回[(左, 上, 右, 下)]相对坐标，按文字可能性从高到低排序
+
+    文字的笔画在形态学梯度中形成密集的边缘，水平闭运算把同一行的字符连成一块；
+    过高、过扁或边缘过稀疏的区域（眼底圆盘边界、血管）被排除。找不到时返回空列表。
+    """
+    height, width = gray.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1.0:
+        small = cv2.resize(gray, (max(int(width * scale), 1), max(int(height * scale), 1)), interpolation=cv2.INTER_AREA)
+    else:
+        small = gray
+    small_height, small_width = small.shape[:2]
+
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, edges = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(small_width // 50, 3), 1))
+    lines = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    candidates = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if h < small_height * 0.01 or h > small_height * 0.15:
+            continue
+        if w < h * 2 or w < small_width * 0.03:
+            continue
+        density = cv2.countNonZero(edges[y:y + h, x:x + w]) / float(w * h)
+        if density < 0.15:
+            continue
+        candidates.append((cv2.countNonZero(edges[y:y + h, x:x + w]), (x, y, x + w, y + h)))
+
+    candidates.sort(key=lambda item: -item[0])
+    pad_x = padding * small_width
+    pad_y = padding * small_height
+    boxes = []
+    for _, (left, top, right, bottom) in candidates[:max_regions]:
+        boxes.append((
+            max((left - pad_x) / small_width, 0.0),
+            max((top - pad_y) / small_height, 0.0),
+            min((right + pad_x) / small_width, 1.0),
+            min((bottom + pad_y) / small_height, 1.0)
+        ))
+
+    return _merge_overlapping(boxes)
+
+def union_box(boxes):
+    """包含所有区域的最小矩形，boxes为空时返回None"""
+    if not boxes:
+        return None
+    return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+def crop_regions(gray, boxes, gap=8):
+    """将各区域从原图中裁出并纵向拼接为一张图，背景取原图中位灰度，OCR只需识别一次"""
+    height, width = gray.shape[:2]
+    crops = []
+    for left, top, right, bottom in boxes:
+        crop = gray[int(top * height):int(bottom * height), int(left * width):int(right * width)]
+        if crop.size:
+            crops.append(crop)
+    if not crops:
+        return None
+
+    background = int(np.median(gray))
+    canvas_width = max(crop.shape[1] for crop in crops)
+    canvas = np.full((sum(crop.shape[0] for crop in crops) + gap * (len(crops) + 1), canvas_width), background, dtype=gray.dtype)
+    y = gap
+    for crop in crops:
+        canvas[y:y + crop.shape[0], :crop.shape[1]] = crop
+        y += crop.shape[0] + gap
+    return canvas
+
+def _merge_overlapping(boxes):
+    """合并相交的区域，避免同一块文字被重复识别；保持原有顺序"""
+    merged = []
+    for box in boxes:
+        for i, other in enumerate(merged):
+            if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                merged[i] = union_box([box, other])
+                break
+        else:
+            merged.append(box)
+    return merged
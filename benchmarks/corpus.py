@@ -0,0 +1,87 @@
+import os
+import random
+from datetime import date, timedelta
+from PIL import Image, ImageDraw, ImageFont
+
+# 常见系统中可以显示中文的字体，找不到时用Pillow默认字体绘制拼音
+CJK_FONT_CANDIDATES = [
+    'C:\\Windows\\Fonts\\msyh.ttc',
+    'C:\\Windows\\Fonts\\simhei.ttf',
+    '/System/Library/Fonts/PingFang.ttc',
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+]
+
+SURNAMES = [('张', 'Zhang'), ('王', 'Wang'), ('李', 'Li'), ('赵', 'Zhao'), ('刘', 'Liu'), ('陈', 'Chen')]
+GIVEN_NAMES = [('伟', 'Wei'), ('芳', 'Fang'), ('敏', 'Min'), ('静', 'Jing'), ('磊', 'Lei'), ('洋', 'Yang')]
+
+def load_font(size):
+    """返回(字体, 是否支持中文)"""
+    for path in CJK_FONT_CANDIDATES:
+        if os.path.exists(path):
+            try:
+                return ImageFont.truetype(path, size), True
+            except OSError:
+                continue
+    try:
+        return ImageFont.load_default(size), False
+    except TypeError:
+        # Pillow 10.1之前的默认字体不能指定大小
+        return ImageFont.load_default(), False
+
+def generate_corpus(folder, count, size=(2048, 1536), seed=0, fmt='JPEG'):
+    """生成count张模拟眼底照片，底部文字条印有姓名和日期，返回[(路径, 姓名, 日期)]
+
+    文件名不含姓名和日期，保证提取结果只能来自图片内容。
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    font, cjk = load_font(max(size[1] // 24, 12))
+    ext = '.png' if fmt == 'PNG' else '.jpg'
+    start = date(2023, 1, 1)
+
+    manifest = []
+    for index in range(count):
+        surname, given = rng.choice(SURNAMES), rng.choice(GIVEN_NAMES)
+        name = surname[0] + given[0] if cjk else f'{surname[1]} {given[1]}'
+        shot_date = start + timedelta(days=rng.randrange(730))
+
+        img = _draw_fundus(size, rng)
+        draw = ImageDraw.Draw(img)
+        band_top = int(size[1] * 0.88)
+        draw.rectangle((0, band_top, size[0], size[1]), fill=(0, 0, 0))
+        label = f'姓名：{name}  日期：{shot_date:%Y-%m-%d}' if cjk else f'Name: {name}  Date: {shot_date:%Y-%m-%d}'
+        draw.text((size[0] // 40, band_top + (size[1] - band_top) // 4), label, fill=(255, 255, 255), font=font)
+
+        path = os.path.join(folder, f'IMG_{index:05d}{ext}')
+        if fmt == 'JPEG':
+            img.save(path, format=fmt, quality=90)
+        else:
+            img.save(path, format=fmt)
+        manifest.append((path, name, shot_date.strftime('%Y%m%d')))
+
+    return manifest
+
+def _draw_fundus(size, rng):
+    """暗色背景上的橙红色圆盘和几条血管，体积和压缩特性接近真实眼底照片"""
+    width, height = size
+    img = Image.new('RGB', size, (8, 4, 4))
+    draw = ImageDraw.Draw(img)
+
+    radius = int(min(width, height * 0.88) * 0.45)
+    cx, cy = width // 2, int(height * 0.44)
+    draw.ellipse((cx - radius, cy - radius, cx + radius, cy + radius),
+                 fill=(190 + rng.randrange(40), 80 + rng.randrange(30), 30))
+
+    # 视盘和血管
+    disc_x = cx + rng.choice((-1, 1)) * radius // 3
+    draw.ellipse((disc_x - radius // 8, cy - radius // 8, disc_x + radius // 8, cy + radius // 8), fill=(245, 200, 120))
+    for _ in range(8):
+        points = [(disc_x, cy)]
+        for _ in range(5):
+            x, y = points[-1]
+            points.append((x + rng.randint(-radius // 4, radius // 4), y + rng.randint(-radius // 4, radius // 4)))
+        draw.line(points, fill=(120, 20, 20), width=max(radius // 60, 2))
+
+    return img
@@ -0,0 +1,159 @@
+import json
+import random
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+class MockOllamaServer:
+    """进程内运行的Ollama替身，实现/api/generate、/api/chat和/api/tags
+
+    latency为每个生成请求的平均延迟（秒），jitter为延迟的随机浮动比例；
+    failure_rate比例的请求返回500，用于触发重试、端点摘除和熔断。
+    请求带format参数时按JSON输出，stream为True时以NDJSON逐段输出。
+    """
+
+    def __init__(self, latency=0.2, jitter=0.2, failure_rate=0.0, name='张三', date='2024-01-15',
+                 model='qwen3-vl:4b', host='127.0.0.1', port=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.name = name
+        self.date = date
+        self.model = model
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer((host, port), _make_handler(self))
+        self._thread = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-ollama', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'requests': 0, 'failures': 0, 'in_flight': 0, 'peak_in_flight': 0}
+
+    def _begin(self):
+        """记录请求并决定本次是否注入失败，返回(是否失败, 延迟秒数)"""
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['in_flight'] += 1
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.stats['in_flight'])
+            failed = self._random.random() < self.failure_rate
+            if failed:
+                self.stats['failures'] += 1
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+        return failed, max(delay, 0)
+
+    def _end(self):
+        with self._lock:
+            self.stats['in_flight'] -= 1
+
+    def reply_text(self, body):
+        if body.get('format'):
+            return json.dumps({'name': self.name, 'date': self.date}, ensure_ascii=False)
+        return f'姓名：{self.name}\n日期：{self.date}\n'
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == '/api/tags':
+                self._send_json({'models': [{'name': server.model}]})
+            else:
+                self._send_json({'error': 'not found'}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+
+            if self.path not in ('/api/generate', '/api/chat'):
+                self._send_json({'error': 'not found'}, 404)
+                return
+
+            # 不带prompt的generate请求只加载模型
+            if self.path == '/api/generate' and 'prompt' not in body:
+                self._send_json({'model': server.model, 'done': True})
+                return
+
+            failed, delay = server._begin()
+            try:
+                time.sleep(delay)
+                if failed:
+                    self._send_json({'error': 'injected failure'}, 500)
+                    return
+
+                text = server.reply_text(body)
+                if body.get('stream'):
+                    self._send_stream(text, chat=self.path == '/api/chat')
+                elif self.path == '/api/chat':
+                    self._send_json({'message': {'role': 'assistant', 'content': text}, 'done': True})
+                else:
+                    self._send_json({'response': text, 'done': True})
+            finally:
+                server._end()
+
+        def _send_json(self, obj, status=200):
+            data = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端超时或取消后已断开
+                self.close_connection = True
+
+        def _send_stream(self, text, chat=False):
+            """按行切分输出，模拟模型逐段生成；客户端提前断开时停止发送"""
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+
+            chunks = [line + '\n' for line in text.split('\n') if line] or [text]
+            try:
+                for chunk in chunks + ['']:
+                    if chat:
+                        record = {'message': {'role': 'assistant', 'content': chunk}}
+                    else:
+                        record = {'response': chunk}
+                    record['done'] = not chunk
+                    self._write_chunk(json.dumps(record, ensure_ascii=False) + '\n')
+                self.wfile.write(b'0\r\n\r\n')
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+        def _write_chunk(self, text):
+            data = text.encode('utf-8')
+            self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+            self.wfile.flush()
+
+    return Handler
@@ -0,0 +1,337 @@
+"""批量重命名吞吐量基准测试
+
+在进程内启动模拟Ollama服务，生成带姓名和日期文字条的合成图片，分别通过
+BatchProcessor（顺序、线程流水线、asyncio流水线）和/api/batch_process路由处理，
+输出每秒处理文件数、单文件延迟分位数和峰值内存，结果保存为JSON以便与之前的运行对比。
+
+    python -m benchmarks.run_benchmark --files 200 --latency 0.3
+    python -m benchmarks.run_benchmark --failure-rate 0.1 --compare benchmarks/results/xxx.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from config import Config
+from benchmarks.mock_ollama import MockOllamaServer
+from benchmarks.corpus import generate_corpus
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SCENARIOS = ['sequential', 'thread', 'asyncio', 'route']
+DEFAULT_RESULTS_FOLDER = os.path.join(ROOT, 'benchmarks', 'results')
+
+class RssSampler:
+    """后台线程定期采样当前进程（及子进程）的常驻内存，记录峰值（字节）"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss() or 0
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss() or 0)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+def current_rss():
+    """当前常驻内存（字节），无法获取时返回None；安装psutil时包含OCR子进程"""
+    if psutil is not None:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def process_peak_rss():
+    """进程启动以来的峰值内存（字节）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS以字节为单位，Linux以KB为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class TimedFiles:
+    """包装输入文件迭代器，记录每个文件被处理器取走的时间"""
+
+    def __init__(self, image_files):
+        self.image_files = image_files
+        self.started = {}
+
+    def __iter__(self):
+        for image_path in self.image_files:
+            if isinstance(image_path, str):
+                self.started[os.path.basename(image_path)] = time.perf_counter()
+            yield image_path
+
+def summarize(name, started, finished, statuses, elapsed, peak_rss, server_stats):
+    """单文件延迟为文件被取走到其结果产出的时间"""
+    latencies = [finished[key] - started[key] for key in finished if key in started]
+    counts = {}
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+
+    return {
+        'scenario': name,
+        'files': len(statuses),
+        'elapsed_s': round(elapsed, 3),
+        'files_per_s': round(len(statuses) / elapsed, 2) if elapsed > 0 else None,
+        'latency_ms': {
+            label: round(value * 1000, 1) if value is not None else None
+            for label, value in (('p50', percentile(latencies, 50)),
+                                 ('p95', percentile(latencies, 95)),
+                                 ('p99', percentile(latencies, 99)),
+                                 ('max', max(latencies) if latencies else None))
+        },
+        'peak_rss_mb': round(peak_rss / 1024 / 1024, 1) if peak_rss else None,
+        'statuses': counts,
+        'server': dict(server_stats)
+    }
+
+def run_processor_scenario(name, folder, args, server):
+    from app.services.ollama_client import OllamaClient
+    from app.services.text_extractor import TextExtractor
+    from app.services.batch_processor import BatchProcessor
+
+    client = OllamaClient(base_url=server.url, model=server.model)
+    extractor = TextExtractor(client, check_connection=False, cache=None)
+    processor = BatchProcessor(text_extractor=extractor)
+    options = {
+        'parallel': name != 'sequential',
+        'pipeline': 'asyncio' if name == 'asyncio' else 'thread',
+        'concurrency': {'vlm': args.vlm_workers, 'ocr': args.ocr_workers},
+        'file_timeout': args.file_timeout
+    }
+
+    image_files = TimedFiles(processor.collect_image_files(folder, options))
+    finished = {}
+    statuses = []
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        for result in processor.iter_process(iter(image_files), options):
+            finished[result['original_name']] = time.perf_counter()
+            statuses.append(result['status'])
+        elapsed = time.perf_counter() - start
+
+    return summarize(name, image_files.started, finished, statuses, elapsed, sampler.peak, server.stats)
+
+def run_route_scenario(folder, args, server):
+    """通过Flask测试客户端以NDJSON流式调用/api/batch_process，记录每条记录的到达时间"""
+    Config.OLLAMA_BASE_URL = server.url
+    Config.OLLAMA_MODEL = server.model
+    Config.OLLAMA_WARMUP = False
+    Config.EXTRACTION_CACHE_ENABLED = False
+
+    from app import create_app
+    app = create_app()
+    services = app.extensions['services']
+    timed = {}
+
+    # 包装路由使用的处理器，记录文件被取走的时间
+    create_batch_processor = services.create_batch_processor
+    def create_timed_processor():
+        processor = create_batch_processor()
+        collect_image_files = processor.collect_image_files
+        def collect(folder_path, options):
+            timed['files'] = TimedFiles(collect_image_files(folder_path, options))
+            return iter(timed['files'])
+        processor.collect_image_files = collect
+        return processor
+    services.create_batch_processor = create_timed_processor
+
+    options = {
+        'stream': 'ndjson',
+        'journal': False,
+        'concurrency': {'vlm': args.vlm_workers, 'ocr': args.ocr_workers},
+        'file_timeout': args.file_timeout
+    }
+    finished = {}
+    statuses = []
+    buffer = b''
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        response = app.test_client().post('/api/batch_process', json={'folder_path': folder, 'options': options},
+                                          buffered=False)
+        for chunk in response.response:
+            buffer += chunk
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                record = json.loads(line)
+                if record['type'] == 'file':
+                    finished[record['original_name']] = time.perf_counter()
+                    statuses.append(record['status'])
+        response.close()
+        elapsed = time.perf_counter() - start
+    services.shutdown()
+
+    started = timed['files'].started if 'files' in timed else {}
+    return summarize('route', started, finished, statuses, elapsed, sampler.peak, server.stats)
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, baseline):
+    """按场景对比吞吐量、p95延迟和峰值内存的变化"""
+    baseline_scenarios = {item['scenario']: item for item in baseline.get('scenarios', [])}
+    print(f"\n与基线对比: {baseline.get('timestamp')} ({baseline.get('git_revision')})")
+    for item in current['scenarios']:
+        base = baseline_scenarios.get(item['scenario'])
+        if base is None:
+            continue
+        changes = []
+        for label, now, before in (('files/s', item['files_per_s'], base.get('files_per_s')),
+                                   ('p95', item['latency_ms']['p95'], base.get('latency_ms', {}).get('p95')),
+                                   ('peak RSS', item['peak_rss_mb'], base.get('peak_rss_mb'))):
+            if now is None or not before:
+                continue
+            changes.append(f'{label} {before} -> {now} ({(now - before) / before * 100:+.1f}%)')
+        print(f"  {item['scenario']:<10} " + ', '.join(changes))
+
+def latest_result(folder):
+    paths = sorted(glob.glob(os.path.join(folder, 'benchmark-*.json')))
+    return paths[-1] if paths else None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='批量重命名吞吐量基准测试')
+    parser.add_argument('--files', type=int, default=100, help='合成图片数量')
+    parser.add_argument('--image-size', default='2048x1536', help='合成图片尺寸，如2048x1536')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟大模型的平均延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.2, help='延迟的随机浮动比例')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='返回500的请求比例')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='逗号分隔，可选: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--vlm-workers', type=int, default=Config.BATCH_VLM_WORKERS)
+    parser.add_argument('--ocr-workers', type=int, default=Config.BATCH_OCR_WORKERS)
+    parser.add_argument('--file-timeout', type=float, default=Config.BATCH_FILE_TIMEOUT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=DEFAULT_RESULTS_FOLDER, help='结果保存目录')
+    parser.add_argument('--compare', help='作为基线的结果文件，默认与输出目录中最近一次结果对比')
+    parser.add_argument('--no-save', action='store_true', help='不保存本次结果')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"未知的场景: {', '.join(sorted(unknown))}")
+    width, height = (int(v) for v in args.image_size.lower().split('x'))
+
+    workdir = tempfile.mkdtemp(prefix='rename-bench-')
+    try:
+        source = os.path.join(workdir, 'source')
+        print(f'生成{args.files}张合成图片 ({width}x{height}) ...')
+        generate_corpus(source, args.files, size=(width, height), seed=args.seed)
+
+        results = []
+        with MockOllamaServer(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                              seed=args.seed) as server:
+            for name in scenarios:
+                # 处理过程会重命名文件，每个场景使用一份新的副本
+                folder = os.path.join(workdir, name)
+                shutil.copytree(source, folder)
+                server.reset_stats()
+
+                if name == 'route':
+                    result = run_route_scenario(folder, args, server)
+                else:
+                    result = run_processor_scenario(name, folder, args, server)
+                results.append(result)
+
+                latency = result['latency_ms']
+                print(f"{name:<10} {result['files']:>5} 个文件  {result['files_per_s']:>8} files/s  "
+                      f"p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  "
+                      f"峰值内存 {result['peak_rss_mb']}MB  {result['statuses']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'parameters': {
+            'files': args.files,
+            'image_size': [width, height],
+            'latency': args.latency,
+            'jitter': args.jitter,
+            'failure_rate': args.failure_rate,
+            'vlm_workers': args.vlm_workers,
+            'ocr_workers': args.ocr_workers,
+            'file_timeout': args.file_timeout,
+            'stream': Config.OLLAMA_STREAM,
+            'structured_output': Config.OLLAMA_STRUCTURED_OUTPUT
+        },
+        'process_peak_rss_mb': round(process_peak_rss() / 1024 / 1024, 1) if process_peak_rss() else None,
+        'scenarios': results
+    }
+
+    baseline_path = args.compare or latest_result(args.output)
+    if baseline_path:
+        with open(baseline_path, encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+    if not args.no_save:
+        os.makedirs(args.output, exist_ok=True)
+        path = os.path.join(args.output, f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'\n结果已保存: {path}')
+
+    return report
+
+if __name__ == '__main__':
+    main()
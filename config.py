@@ -2,8 +2,86 @@ import os
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
+    # 多个Ollama实例用逗号分隔，请求按在途数量分配到各实例
     OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL') or 'http://localhost:11434'
     OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL') or 'qwen3-vl:4b'
+    # Ollama连接池大小，不小于VLM阶段的并发数；5xx和连接中断的重试次数与退避基数（秒）
+    OLLAMA_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE') or 16)
+    OLLAMA_MAX_RETRIES = int(os.environ.get('OLLAMA_MAX_RETRIES') or 2)
+    OLLAMA_RETRY_BACKOFF = float(os.environ.get('OLLAMA_RETRY_BACKOFF') or 0.5)
+    # 端点连续失败多少次后摘除，以及被摘除端点的健康检查间隔（秒）
+    OLLAMA_MAX_FAILURES = int(os.environ.get('OLLAMA_MAX_FAILURES') or 3)
+    OLLAMA_RECHECK_INTERVAL = float(os.environ.get('OLLAMA_RECHECK_INTERVAL') or 10)
+    # 熔断：连续失败多少次后跳过大模型直接走OCR，以及熔断后多久放行一个探测请求（秒）
+    OLLAMA_BREAKER_FAILURES = int(os.environ.get('OLLAMA_BREAKER_FAILURES') or 5)
+    OLLAMA_BREAKER_RESET = float(os.environ.get('OLLAMA_BREAKER_RESET') or 30)
+    # 流式接收提取结果，姓名和日期解析完成（结构化输出时JSON对象完整）后提前结束生成
+    OLLAMA_STREAM = (os.environ.get('OLLAMA_STREAM') or 'true').lower() == 'true'
+    # 以JSON Schema约束提取和诊断的输出格式，并限制生成的token数
+    OLLAMA_STRUCTURED_OUTPUT = (os.environ.get('OLLAMA_STRUCTURED_OUTPUT') or 'true').lower() == 'true'
+    OLLAMA_EXTRACT_NUM_PREDICT = int(os.environ.get('OLLAMA_EXTRACT_NUM_PREDICT') or 64)
+    OLLAMA_DIAGNOSIS_NUM_PREDICT = int(os.environ.get('OLLAMA_DIAGNOSIS_NUM_PREDICT') or 512)
+    # 健康检查结果的缓存时间（秒）；启动时是否预加载模型及模型保持加载的时长
+    OLLAMA_HEALTH_TTL = float(os.environ.get('OLLAMA_HEALTH_TTL') or 30)
+    OLLAMA_WARMUP = (os.environ.get('OLLAMA_WARMUP') or 'false').lower() == 'true'
+    OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE') or None
+    # 发送给视觉大模型前的图片处理：长边上限（0不缩小）、JPEG质量，
+    # 以及可选的裁剪区域"左,上,右,下"（相对坐标，如只保留底部文字条"0,0.85,1,1"），
+    # 为auto时按检测到的文字区域裁剪
+    VLM_IMAGE_MAX_SIDE = int(os.environ.get('VLM_IMAGE_MAX_SIDE') or 1280)
+    VLM_IMAGE_JPEG_QUALITY = int(os.environ.get('VLM_IMAGE_JPEG_QUALITY') or 85)
+    VLM_IMAGE_CROP = os.environ.get('VLM_IMAGE_CROP') or None
+    if VLM_IMAGE_CROP and VLM_IMAGE_CROP != 'auto':
+        VLM_IMAGE_CROP = tuple(float(v) for v in VLM_IMAGE_CROP.split(','))
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+    
+    # 后台批量任务
+    BATCH_JOB_WORKERS = int(os.environ.get('BATCH_JOB_WORKERS') or 2)
+    BATCH_JOB_HISTORY = int(os.environ.get('BATCH_JOB_HISTORY') or 100)
+    
+    # 批处理流水线各阶段并发度
+    BATCH_VLM_WORKERS = int(os.environ.get('BATCH_VLM_WORKERS') or 4)
+    BATCH_OCR_WORKERS = int(os.environ.get('BATCH_OCR_WORKERS') or os.cpu_count() or 1)
+    BATCH_MAX_IN_FLIGHT = int(os.environ.get('BATCH_MAX_IN_FLIGHT') or 64)
+    # 流水线实现：thread为线程池，asyncio为事件循环（需要安装httpx）
+    BATCH_PIPELINE = os.environ.get('BATCH_PIPELINE') or 'thread'
+    
+    # 单个文件的处理时间预算（秒），大模型和OCR阶段共享，0表示不限时
+    BATCH_FILE_TIMEOUT = float(os.environ.get('BATCH_FILE_TIMEOUT') or 180)
+    
+    # 批处理检查点日志，用于崩溃后恢复
+    BATCH_JOURNAL_ENABLED = (os.environ.get('BATCH_JOURNAL_ENABLED') or 'true').lower() == 'true'
+    BATCH_JOURNAL_FOLDER = os.environ.get('BATCH_JOURNAL_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'journals')
+    BATCH_JOURNAL_FSYNC_EVERY = int(os.environ.get('BATCH_JOURNAL_FSYNC_EVERY') or 32)
+    BATCH_JOURNAL_FSYNC_INTERVAL = float(os.environ.get('BATCH_JOURNAL_FSYNC_INTERVAL') or 1.0)
+    
+    # 提取结果缓存
+    EXTRACTION_CACHE_ENABLED = (os.environ.get('EXTRACTION_CACHE_ENABLED') or 'true').lower() == 'true'
+    EXTRACTION_CACHE_PATH = os.environ.get('EXTRACTION_CACHE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'extraction_cache.db')
+    EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get('EXTRACTION_CACHE_MAX_ENTRIES') or 100000)
+    EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get('EXTRACTION_CACHE_MAX_BYTES') or 64 * 1024 * 1024)
+    
+    # OCR引擎：auto在安装了tesserocr时使用进程内引擎池，否则每次调用启动tesseract进程；
+    # 也可指定tesserocr或pytesseract
+    OCR_ENGINE = os.environ.get('OCR_ENGINE') or 'auto'
+    # OCR只识别检测到的文字区域（如底部文字条），区域中识别不出时再识别整张图片
+    OCR_TEXT_REGIONS = (os.environ.get('OCR_TEXT_REGIONS') or 'true').lower() == 'true'
+    # 按相机（尺寸、EXIF型号、边框灰度分布）学习的文字区域位置，连续未命中多少次后重新学习
+    LAYOUT_CACHE_ENABLED = (os.environ.get('LAYOUT_CACHE_ENABLED') or 'true').lower() == 'true'
+    LAYOUT_CACHE_PATH = os.environ.get('LAYOUT_CACHE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'overlay_layouts.db')
+    LAYOUT_CACHE_MAX_MISSES = int(os.environ.get('LAYOUT_CACHE_MAX_MISSES') or 3)
+    # OCR兜底：姓名和日期的置信度都达到该值（0-100）后不再尝试其他预处理方式，
+    # 以及各预处理方式历史成功率的统计，用于决定尝试顺序
+    OCR_MIN_CONFIDENCE = float(os.environ.get('OCR_MIN_CONFIDENCE') or 60)
+    OCR_STATS_ENABLED = (os.environ.get('OCR_STATS_ENABLED') or 'true').lower() == 'true'
+    OCR_STATS_PATH = os.environ.get('OCR_STATS_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'ocr_stats.db')
+    
+    # 文件夹监视：轮询间隔和判定文件写入完成的静默时间（秒）
+    WATCH_POLL_INTERVAL = float(os.environ.get('WATCH_POLL_INTERVAL') or 2.0)
+    WATCH_SETTLE_SECONDS = float(os.environ.get('WATCH_SETTLE_SECONDS') or 3.0)
+    
+    # 预览生成的重命名计划
+    BATCH_PLAN_FOLDER = os.environ.get('BATCH_PLAN_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plans')
+    BATCH_PLAN_TTL = int(os.environ.get('BATCH_PLAN_TTL') or 24 * 3600)
@@ -0,0 +1,100 @@
+import json
+import os
+import tempfile
+from app.services.batch_journal import BatchJournal
+
+def _touch(path):
+    with open(path, 'wb') as f:
+        f.write(b'image')
+
+def _success(src, dst):
+    return {'original_name': os.path.basename(src), 'new_name': os.path.basename(dst), 'status': 'success'}
+
+# 测试中断后恢复：成功的文件及其新文件名被跳过，失败的文件重新处理
+def test_resume_skips_only_successes():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'journal', 'batch.jsonl')
+        ok = os.path.join(directory, 'a.jpg')
+        ok_dst = os.path.join(directory, '张三_20240101.jpg')
+        failed = os.path.join(directory, 'b.jpg')
+
+        journal = BatchJournal.open(path)
+        journal.record_planned(ok, ok_dst)
+        journal.record_outcome(ok, _success(ok, ok_dst), ok_dst)
+        journal.record_outcome(failed, {'original_name': 'b.jpg', 'status': 'error', 'error': '连接失败'})
+        # 没有调用finish，模拟服务中途退出
+        journal.close()
+
+        journal = BatchJournal.open(path)
+        try:
+            assert journal.is_resumed()
+            assert journal.should_skip(ok)
+            assert journal.should_skip(ok_dst)
+            assert not journal.should_skip(failed)
+            results = journal.completed_results()
+            assert [result['new_name'] for result in results] == ['张三_20240101.jpg']
+            assert all(result['resumed'] for result in results)
+        finally:
+            journal.close()
+
+# 测试已计划但没有结果的重命名：重命名已生效的补记为成功，未生效的重新处理
+def test_recover_planned_renames():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'batch.jsonl')
+        renamed_src = os.path.join(directory, 'a.jpg')
+        renamed_dst = os.path.join(directory, '张三_20240101.jpg')
+        pending_src = os.path.join(directory, 'b.jpg')
+        pending_dst = os.path.join(directory, '李四_20240102.jpg')
+        _touch(renamed_dst)
+        _touch(pending_src)
+
+        journal = BatchJournal.open(path)
+        journal.record_planned(renamed_src, renamed_dst)
+        journal.record_planned(pending_src, pending_dst)
+        journal.close()
+
+        # 崩溃时最后一行可能只写了一半
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('{"event": "done", "src"')
+
+        journal = BatchJournal.open(path)
+        try:
+            assert journal.should_skip(renamed_src)
+            assert journal.should_skip(renamed_dst)
+            assert not journal.should_skip(pending_src)
+        finally:
+            journal.close()
+
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        # 写了一半的行之后追加的记录仍然单独成行
+        assert json.loads(lines[-1])['event'] == 'done'
+
+# 测试已完成的批次不再恢复，同一日志同时只能被一个批次打开
+def test_finished_journal_starts_over():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'batch.jsonl')
+        src = os.path.join(directory, 'a.jpg')
+        dst = os.path.join(directory, '张三_20240101.jpg')
+
+        journal = BatchJournal.open(path)
+        try:
+            BatchJournal.open(path)
+            assert False, '同一日志不应被打开两次'
+        except Exception as e:
+            assert '正在进行' in str(e)
+        journal.record_outcome(src, _success(src, dst), dst)
+        journal.finish()
+
+        journal = BatchJournal.open(path)
+        try:
+            assert not journal.is_resumed()
+            assert not journal.should_skip(src)
+        finally:
+            journal.close()
+
+if __name__ == '__main__':
+    test_resume_skips_only_successes()
+    test_recover_planned_renames()
+    test_finished_journal_starts_over()
+    print('批处理日志测试通过')
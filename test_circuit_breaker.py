@@ -0,0 +1,85 @@
+from app.services import circuit_breaker
+from app.services.circuit_breaker import CircuitBreaker
+
+class _Clock:
+    """代替time模块，由测试推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+def _with_clock(test):
+    def run():
+        original = circuit_breaker.time
+        clock = _Clock()
+        circuit_breaker.time = clock
+        try:
+            test(clock)
+        finally:
+            circuit_breaker.time = original
+    run.__name__ = test.__name__
+    return run
+
+# 测试连续失败达到阈值后打开，成功会清零失败计数
+@_with_clock
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow_request()
+    assert not breaker.is_open()
+
+    breaker.record_failure()
+
+    assert breaker.snapshot()['state'] == CircuitBreaker.OPEN
+    assert breaker.is_open()
+    assert not breaker.allow_request()
+
+# 测试超时后进入半开，只放行一个探测请求；探测失败重新打开，成功则关闭
+@_with_clock
+def test_half_open_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+
+    # is_open只查看状态，不占用探测名额
+    assert not breaker.is_open()
+    assert breaker.allow_request()
+    assert breaker.is_open()
+    assert not breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.snapshot()['state'] == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.now += 30
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.snapshot() == {'state': CircuitBreaker.CLOSED, 'consecutive_failures': 0, 'opened_at': None}
+    assert breaker.allow_request()
+
+# 测试探测请求没有回报结果时，超时后允许新的探测
+@_with_clock
+def test_stale_probe_is_replaced(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow_request()
+    clock.now += 10
+    assert not breaker.allow_request()
+
+    clock.now += 20
+
+    assert not breaker.is_open()
+    assert breaker.allow_request()
+
+if __name__ == '__main__':
+    test_opens_after_consecutive_failures()
+    test_half_open_probe()
+    test_stale_probe_is_replaced()
+    print('熔断器测试通过')
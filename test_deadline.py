@@ -0,0 +1,49 @@
+import pickle
+import time
+from app.services.deadline import Deadline, DeadlineExceeded, BatchCancelled, CancelToken
+
+def _raises(exception, func):
+    try:
+        func()
+    except exception:
+        return True
+    return False
+
+# 测试不限时的预算：没有剩余时间，阻塞调用使用默认超时
+def test_unlimited():
+    deadline = Deadline()
+    assert deadline.remaining() is None
+    assert not deadline.expired()
+    assert deadline.timeout(30) == 30
+    deadline.check()
+
+# 测试超时后check抛出DeadlineExceeded，阻塞调用的超时不超过剩余时间
+def test_expiry():
+    deadline = Deadline(60)
+    assert 59 < deadline.remaining() <= 60
+    assert deadline.timeout(5) == 5
+    assert 59 < deadline.timeout() <= 60
+
+    expired = Deadline(expires_at=time.time() - 1)
+    assert expired.expired()
+    assert expired.remaining() == 0.0
+    assert expired.timeout(5) == 0.0
+    assert _raises(DeadlineExceeded, expired.check)
+
+# 测试取消优先于超时，detach去掉取消标记后可以传入子进程
+def test_cancel_and_detach():
+    token = CancelToken()
+    deadline = Deadline(expires_at=time.time() - 1, cancel_token=token)
+    token.cancel()
+    assert _raises(BatchCancelled, deadline.check)
+
+    detached = pickle.loads(pickle.dumps(deadline.detach()))
+    assert detached.cancel_token is None
+    assert detached.expires_at == deadline.expires_at
+    assert _raises(DeadlineExceeded, detached.check)
+
+if __name__ == '__main__':
+    test_unlimited()
+    test_expiry()
+    test_cancel_and_detach()
+    print('时间预算测试通过')
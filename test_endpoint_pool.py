@@ -0,0 +1,73 @@
+import threading
+import time
+from app.services.endpoint_pool import EndpointPool
+
+A = 'http://gpu-a:11434'
+B = 'http://gpu-b:11434'
+
+def _acquire(pool, url):
+    """占用端点直到选中指定的那个，其余立即释放"""
+    while True:
+        picked = pool.acquire()
+        if picked == url:
+            return picked
+        pool.release(picked)
+
+# 测试选择在途请求最少的端点，并列时轮流选择
+def test_least_outstanding_with_rotation():
+    pool = EndpointPool([A, B], probe=lambda url: True)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first, second} == {A, B}
+
+    pool.release(first)
+    assert pool.acquire() == first
+
+    pool.release(first)
+    pool.release(second)
+    picks = [pool.acquire() for _ in range(4)]
+    assert picks.count(A) == picks.count(B) == 2
+
+# 测试连续失败的端点被摘除，健康检查通过后恢复
+def test_ejected_endpoint_recovers_after_probe():
+    healthy = threading.Event()
+    pool = EndpointPool([A, B], probe=lambda url: healthy.is_set(), max_failures=2, recheck_interval=0.01)
+
+    for _ in range(2):
+        pool.release(_acquire(pool, A), failed=True)
+
+    assert [stat['healthy'] for stat in pool.stats()] == [False, True]
+    for _ in range(3):
+        url = pool.acquire()
+        assert url == B
+        pool.release(url)
+
+    healthy.set()
+    deadline = time.time() + 2
+    while not pool.stats()[0]['healthy'] and time.time() < deadline:
+        time.sleep(0.01)
+
+    stats = pool.stats()
+    assert stats[0]['healthy']
+    assert stats[0]['consecutive_failures'] == 0
+    assert A in {pool.acquire(), pool.acquire()}
+
+# 测试只有一个端点时不摘除，全部被摘除时仍照常选择
+def test_never_ejects_last_endpoint():
+    pool = EndpointPool([A], probe=lambda url: False, max_failures=1)
+    for _ in range(3):
+        pool.release(pool.acquire(), failed=True)
+    assert pool.stats()[0]['healthy']
+    assert pool.acquire() == A
+
+# 测试地址配置支持逗号分隔，去掉空白和末尾斜杠
+def test_parse_urls():
+    assert EndpointPool.parse_urls(f'{A}/, {B} ,') == [A, B]
+    assert EndpointPool.parse_urls([A, '']) == [A]
+
+if __name__ == '__main__':
+    test_least_outstanding_with_rotation()
+    test_ejected_endpoint_recovers_after_probe()
+    test_never_ejects_last_endpoint()
+    test_parse_urls()
+    print('端点负载均衡测试通过')
@@ -0,0 +1,83 @@
+import os
+import tempfile
+from app.services import extraction_cache
+from app.services.extraction_cache import ExtractionCache
+
+class _Clock:
+    """代替time模块，每次取时间递增1秒，保证访问时间的先后确定"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 1
+        return self.now
+
+def _with_clock(test):
+    def run():
+        original = extraction_cache.time
+        extraction_cache.time = _Clock()
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                test(os.path.join(directory, 'cache.db'))
+        finally:
+            extraction_cache.time = original
+    run.__name__ = test.__name__
+    return run
+
+# 测试超过条目数上限时淘汰最久未访问的条目，读取会刷新访问时间
+@_with_clock
+def test_evicts_least_recently_used(db_path):
+    cache = ExtractionCache(db_path, max_entries=2)
+    cache.put('a', {'name': '张三'})
+    cache.put('b', {'name': '李四'})
+    assert cache.get('a') == {'name': '张三'}
+
+    cache.put('c', {'name': '王五'})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'name': '张三'}
+    assert cache.get('c') == {'name': '王五'}
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    assert (stats['hits'], stats['misses']) == (3, 1)
+    cache.close()
+
+# 测试容量上限：覆盖写入不重复计数，超出字节数时按访问时间淘汰
+@_with_clock
+def test_evicts_by_size(db_path):
+    value = {'text': 'x' * 100}
+    size = len('{"text": "' + 'x' * 100 + '"}')
+    cache = ExtractionCache(db_path, max_bytes=size * 2)
+    cache.put('a', value)
+    cache.put('a', value)
+    cache.put('b', value)
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['bytes'] == size * 2
+
+    cache.put('c', value)
+
+    assert cache.get('a') is None
+    assert cache.stats()['bytes'] == size * 2
+    cache.close()
+
+    # 重新打开时从数据库恢复条目数和容量
+    cache = ExtractionCache(db_path, max_bytes=size * 2)
+    assert (cache.stats()['entries'], cache.stats()['bytes']) == (2, size * 2)
+    assert cache.get('b') == value
+    cache.close()
+
+# 测试输出模式和图片编码参数不同的结果使用不同的键
+def test_key_includes_settings():
+    base = ExtractionCache.make_key('hash', 'qwen3-vl:4b', 2)
+    structured = ExtractionCache.make_key('hash', 'qwen3-vl:4b', 2, {'structured': True, 'image': None})
+    resized = ExtractionCache.make_key('hash', 'qwen3-vl:4b', 2, {'structured': True, 'image': {'max_side': 1024}})
+    assert len({base, structured, resized}) == 3
+    assert structured == ExtractionCache.make_key('hash', 'qwen3-vl:4b', 2, {'image': None, 'structured': True})
+
+if __name__ == '__main__':
+    test_evicts_least_recently_used()
+    test_evicts_by_size()
+    test_key_includes_settings()
+    print('提取结果缓存测试通过')
@@ -0,0 +1,81 @@
+import os
+import tempfile
+from app.services.file_scanner import FileScanner
+
+EXTENSIONS = {'.jpg', '.png'}
+
+def _touch(*parts):
+    path = os.path.join(*parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return path
+
+def _relative(paths, directory):
+    return sorted(os.path.relpath(path, directory).replace(os.sep, '/') for path in paths)
+
+# 测试按扩展名（不区分大小写）、包含/排除模式和深度筛选
+def test_filters_and_depth():
+    with tempfile.TemporaryDirectory() as directory:
+        _touch(directory, 'a.JPG')
+        _touch(directory, 'b.png')
+        _touch(directory, 'notes.txt')
+        _touch(directory, 'left', 'c.jpg')
+        _touch(directory, 'left', 'deep', 'd.jpg')
+        _touch(directory, 'thumbs', 'e.jpg')
+
+        assert _relative(FileScanner(EXTENSIONS).scan(directory), directory) == [
+            'a.JPG', 'b.png', 'left/c.jpg', 'left/deep/d.jpg', 'thumbs/e.jpg']
+        assert _relative(FileScanner(EXTENSIONS, max_depth=0).scan(directory), directory) == ['a.JPG', 'b.png']
+        assert _relative(FileScanner(EXTENSIONS, max_depth=1).scan(directory), directory) == [
+            'a.JPG', 'b.png', 'left/c.jpg', 'thumbs/e.jpg']
+        assert _relative(FileScanner(EXTENSIONS, exclude=['thumbs', '*.png']).scan(directory), directory) == [
+            'a.JPG', 'left/c.jpg', 'left/deep/d.jpg']
+        # 与fnmatch一致，*也匹配路径分隔符
+        assert _relative(FileScanner(EXTENSIONS, include=['left/*']).scan(directory), directory) == [
+            'left/c.jpg', 'left/deep/d.jpg']
+
+# 测试sort为True时每个目录内按文件名产出，子目录在文件之后按名称处理
+def test_sorted_output():
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ('c.jpg', 'a.jpg', 'b.jpg'):
+            _touch(directory, name)
+        _touch(directory, 'z', 'y.jpg')
+        _touch(directory, 'm', 'x.jpg')
+
+        paths = list(FileScanner(EXTENSIONS, sort=True).scan(directory))
+
+        assert [os.path.relpath(path, directory).replace(os.sep, '/') for path in paths] == [
+            'a.jpg', 'b.jpg', 'c.jpg', 'm/x.jpg', 'z/y.jpg']
+
+# 测试边扫描边重命名时，新文件名不会在同一次列举中再次产出
+def test_renamed_files_not_yielded_twice():
+    with tempfile.TemporaryDirectory() as directory:
+        for index in range(500):
+            _touch(directory, f'IMG_{index:04}.jpg')
+
+        seen = []
+        for path in FileScanner(EXTENSIONS).scan(directory):
+            seen.append(os.path.basename(path))
+            os.rename(path, os.path.join(directory, 'renamed_' + os.path.basename(path)))
+
+        assert len(seen) == 500
+        assert not any(name.startswith('renamed_') for name in seen)
+
+# 测试扫描是惰性的：取到第一个文件时其余目录还没有被读取
+def test_scan_is_lazy():
+    with tempfile.TemporaryDirectory() as directory:
+        _touch(directory, 'a', 'first.jpg')
+        _touch(directory, 'b', 'second.jpg')
+
+        paths = FileScanner(EXTENSIONS, sort=True).scan(directory)
+        assert os.path.basename(next(paths)) == 'first.jpg'
+        _touch(directory, 'b', 'added.jpg')
+
+        assert [os.path.basename(path) for path in paths] == ['added.jpg', 'second.jpg']
+
+if __name__ == '__main__':
+    test_filters_and_depth()
+    test_sorted_output()
+    test_renamed_files_not_yielded_twice()
+    test_scan_is_lazy()
+    print('目录扫描测试通过')
@@ -0,0 +1,56 @@
+import os
+import tempfile
+from app.services.rename_planner import RenamePlanner
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+# 测试目录列举之后出现在目标路径上的文件不会被覆盖
+def test_target_created_after_listing():
+    with tempfile.TemporaryDirectory() as directory:
+        src = os.path.join(directory, 'IMG_0001.jpg')
+        _write(src, b'source')
+
+        planner = RenamePlanner()
+        plan = planner.plan([(src, '张三_20240101', '.jpg')])
+        dst = plan[src]
+        assert os.path.basename(dst) == '张三_20240101.jpg'
+
+        # 规划之后、提交之前，其他程序写入了同名文件
+        _write(dst, b'unrelated')
+
+        outcomes = planner.commit(plan, overwrite=True)
+
+        assert outcomes[src]
+        assert _read(dst) == b'unrelated'
+        assert _read(src) == b'source'
+
+        # 同一规划器的下一批不再分配已被占用的文件名
+        plan = planner.plan([(src, '张三_20240101', '.jpg')])
+        assert os.path.basename(plan[src]) == '张三_20240101_1.jpg'
+        assert planner.commit(plan)[src] is None
+        assert _read(plan[src]) == b'source'
+
+# 测试互换文件名时计划内的文件仍按依赖顺序移走
+def test_swap_within_plan():
+    with tempfile.TemporaryDirectory() as directory:
+        a = os.path.join(directory, 'a.jpg')
+        b = os.path.join(directory, 'b.jpg')
+        _write(a, b'a')
+        _write(b, b'b')
+
+        outcomes = RenamePlanner().commit({a: b, b: a})
+
+        assert outcomes == {a: None, b: None}
+        assert _read(a) == b'b'
+        assert _read(b) == b'a'
+
+if __name__ == '__main__':
+    test_target_created_after_listing()
+    test_swap_within_plan()
+    print('重命名规划测试通过')